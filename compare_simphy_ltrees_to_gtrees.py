@@ -1,7 +1,9 @@
 import argparse
 import dendropy
 from dendropy.calculate.treecompare import false_positives_and_negatives
-from itertools import izip
+import iotools
+import newicktools
+import taxa
 
 
 def compare_trees(tr1, tr2):
@@ -82,33 +84,104 @@ def compare_trees(tr1, tr2):
     return (nl, ei1, ei2, fn, fp, rf)
 
 
+def compare_rooted_trees(ll, gl):
+    """
+    Compares the clusters of a locus tree and a gene tree (both rooted)
+
+    Parameters
+    ----------
+    ll : string
+         newick string for the locus tree
+    gl : string
+         newick string for the gene tree
+
+    Returns
+    -------
+    nl : int
+         Size of the shared leaf set (lost lineages are not shared)
+    ci1 : int
+          Number of non-trivial clusters in the locus tree (after
+          restricting it to the shared leaf set)
+    ci2 : int
+          Number of non-trivial clusters in the gene tree (after
+          restricting it to the shared leaf set)
+    fn : int
+         Number of clusters in the locus tree that are not in the gene tree
+    fp : int
+         Number of clusters in the gene tree that are not in the locus tree
+    rf : float
+         Normalized rooted Robinson-Foulds distance, i.e., (FN+FP)/(2*NL-4)
+
+    Clusters are bitmasks over the shared leaves (see newicktools.clusters),
+    so neither tree is built, unrooted or restricted.
+    """
+    gtax = taxa.SymbolTable(newicktools.leaf_labels(gl))
+
+    # NOTE: Assumes no multiple individuals!!
+    ltax = {}
+    for x in newicktools.leaf_labels(ll):
+        y = taxa.simphy_gene(x)
+        if not taxa.is_lost(x) and y in gtax:
+            ltax[x] = gtax[y]
+    shared = set(ltax.values())
+    gtax = {x: i for i, x in enumerate(gtax) if i in shared}
+
+    nl = len(shared)
+    c1 = set([c for c in newicktools.clusters(ll, ltax) if 1 < bin(c).count("1") < nl])
+    c2 = set([c for c in newicktools.clusters(gl, gtax) if 1 < bin(c).count("1") < nl])
+
+    if nl < 3:
+        return (nl, len(c1), len(c2), "NA", "NA", "NA")
+
+    fn = len(c1 - c2)
+    fp = len(c2 - c1)
+    rf = (fn + fp) / (2.0 * nl - 4.0)
+    return (nl, len(c1), len(c2), fn, fp, rf)
+
+
+def format_comparison(nl, ei1, ei2, fn, fp, rf):
+    if rf == "NA":
+        return "%d,%d,%d,%s,%s,%s" % (nl, ei1, ei2, fn, fp, rf)
+    return "%d,%d,%d,%d,%d,%1.6f" % (nl, ei1, ei2, fn, fp, rf)
+
+
 def main(args):
     if args.prefix is None:
         p = ""
     else:
         p = str(args.prefix + ",")
 
-    with open(args.output, "aw") as fo, open(args.ltreelist, "r") as fl, open(
-        args.gtreelist, "r"
-    ) as fg:
+    # --rooted-only implies --rooted
+    with_rooted = args.rooted or args.rooted_only
+
+    with iotools.open_output(args.output, "a") as fo, iotools.open_input(
+        args.ltreelist
+    ) as fl, iotools.open_input(args.gtreelist) as fg:
 
         i = 1
-        for ll, gl in izip(fl, fg):
-            taxa = dendropy.TaxonNamespace()
+        for ll, gl in zip(fl, fg):
+            if with_rooted:
+                rooted = format_comparison(*compare_rooted_trees(ll, gl))
+                if args.rooted_only:
+                    fo.write("%s%d,%s\n" % (p, i, rooted))
+                    i = i + 1
+                    continue
+
+            tax = dendropy.TaxonNamespace()
             ltre = dendropy.Tree.get(
                 string=ll,
                 schema="newick",
                 rooting="force-unrooted",
-                taxon_namespace=taxa,
+                taxon_namespace=tax,
             )
 
             # NOTE: Assumes no multiple individuals!!
             lost = []
-            for x in taxa:
-                if x.label[:5] == "Lost-":
+            for x in tax:
+                if taxa.is_lost(x.label):
                     lost.append(x.label)
                 else:
-                    x.label = str(x.label + " 0")
+                    x.label = taxa.simphy_gene(x.label)
             if len(lost) > 0:
                 ltre.prune_taxa_with_labels(lost)
 
@@ -116,16 +189,14 @@ def main(args):
                 string=gl,
                 schema="newick",
                 rooting="force-unrooted",
-                taxon_namespace=taxa,
+                taxon_namespace=tax,
             )
 
-            [nl, ei1, ei2, fn, fp, rf] = compare_trees(ltre, gtre)
-            if rf == "NA":
-                fo.write("%s%d,%d,%d,%d,%s,%s,%s\n" % (p, i, nl, ei1, ei2, fn, fp, rf))
+            row = format_comparison(*compare_trees(ltre, gtre))
+            if with_rooted:
+                fo.write("%s%d,%s,%s\n" % (p, i, row, rooted))
             else:
-                fo.write(
-                    "%s%d,%d,%d,%d,%d,%d,%1.6f\n" % (p, i, nl, ei1, ei2, fn, fp, rf)
-                )
+                fo.write("%s%d,%s\n" % (p, i, row))
 
             i = i + 1
 
@@ -146,6 +217,17 @@ if __name__ == "__main__":
         help="Append prefix to each row of CSV",
         required=False,
     )
+    parser.add_argument(
+        "-r",
+        "--rooted",
+        action="store_true",
+        help="Append rooted (cluster) NL,CI1,CI2,FN,FP,RF to each row of CSV",
+    )
+    parser.add_argument(
+        "--rooted-only",
+        action="store_true",
+        help="Only compare rooted clusters (implies --rooted)",
+    )
     parser.add_argument(
         "-o", "--output", type=str, help="Output CSV file", required=True
     )
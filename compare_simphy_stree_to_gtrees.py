@@ -1,6 +1,8 @@
 import argparse
 import dendropy
 from dendropy.calculate.treecompare import false_positives_and_negatives
+import iotools
+import taxa
 
 
 def compare_trees(tr1, tr2):
@@ -87,22 +89,27 @@ def main(args):
     else:
         p = str(args.prefix + ",")
 
-    taxa = dendropy.TaxonNamespace()
+    tax = dendropy.TaxonNamespace()
     stre = dendropy.Tree.get(
-        path=args.stree, schema="newick", rooting="force-unrooted", taxon_namespace=taxa
+        data=iotools.read_text(args.stree),
+        schema="newick",
+        rooting="force-unrooted",
+        taxon_namespace=tax,
     )
 
     # NOTE: Assumes no dup-loss and no multiple individuals!!
-    for x in taxa:
-        x.label = str(x.label + " 0 0")
+    for x in tax:
+        x.label = taxa.simphy_gene(x.label)
 
-    with open(args.output, "aw") as fo, open(args.gtreelist, "r") as fi:
+    with iotools.open_output(args.output, "a") as fo, iotools.open_input(
+        args.gtreelist
+    ) as fi:
         for l, line in enumerate(fi.readlines()):
             gtre = dendropy.Tree.get(
                 string=line,
                 schema="newick",
                 rooting="force-unrooted",
-                taxon_namespace=taxa,
+                taxon_namespace=tax,
             )
 
             [nl, ei1, ei2, fn, fp, rf] = compare_trees(stre, gtre)
@@ -1,30 +1,90 @@
 import argparse
-import dendropy
+import iotools
+import newicktools
+import numpy
+import pandas
+import taxa
 
 
-def create_species_counter(stax, ltax):
-    counter = {}
-    for x in stax:
-        counter[x] = 0
+def count_species_copies(stax, ifil):
+    """
+    Counts the copies of each species in each locus tree
 
-    for x in ltax:
-        if x[:5] != "Lost-":
-            y = x.split()[0]
-            counter[y] = counter[y] + 1
+    Parameters
+    ----------
+    stax : list of strings
+           species labels (columns of the matrix)
+    ifil : string
+           name of input locus tree file (one newick string per line)
 
-    return counter
+    Returns
+    -------
+    counts : numpy array of ints (number of trees x number of species)
+             counts[i, j] is the number of leaves of tree i labeled with
+             species j, i.e., [species]_[...], ignoring Lost-* leaves
+    """
+    column = taxa.SymbolTable(stax)
+    rows = []
+    cols = []
+    ntre = 0
+    with iotools.open_input(ifil) as fi:
+        for line in fi:
+            if line.strip() == "":
+                continue
+            for x in newicktools.leaf_labels(line):
+                if not taxa.is_lost(x):
+                    rows.append(ntre)
+                    cols.append(column[taxa.simphy_species(x)])
+            ntre += 1
+
+    flat = numpy.array(rows, dtype=numpy.int64) * len(stax)
+    flat += numpy.array(cols, dtype=numpy.int64)
+    counts = numpy.bincount(flat, minlength=ntre * len(stax))
+    return counts.reshape(ntre, len(stax))
+
+
+def write_species_summary(stax, counts, ofil):
+    """
+    Writes the number of copies of each species across locus trees, i.e.,
+    the maximum and mean number of copies, and the number of trees in which
+    the species is lost (no copies) or duplicated (more than one copy)
+    """
+    table = pandas.DataFrame(
+        {
+            "SPECIES": stax,
+            "MAX_NCPY": counts.max(axis=0, initial=0),
+            "MEAN_NCPY": counts.mean(axis=0) if counts.shape[0] > 0 else 0.0,
+            "NGEN_LOST": (counts == 0).sum(axis=0),
+            "NGEN_DUPL": (counts > 1).sum(axis=0),
+        }
+    )
+    with iotools.open_output(ofil) as f:
+        table.to_csv(f, index=False, float_format="%f")
 
 
 def main(args):
-    stax = dendropy.TaxonNamespace()
-    stre = dendropy.Tree.get(
-        path=args.stree, schema="newick", rooting="force-unrooted", taxon_namespace=stax
+    stax = taxa.SymbolTable.cached(args.stree, taxa.newick_taxa).labels
+
+    counts = count_species_copies(stax, args.ltreelist)
+
+    if args.summary is not None:
+        write_species_summary(stax, counts, args.summary)
+
+    if args.output.endswith(".npy"):
+        numpy.save(args.output, counts)
+        return
+
+    # Number of leaves and number of species in each locus tree
+    nlea = counts.sum(axis=1)
+    ntax = (counts > 0).sum(axis=1)
+    table = numpy.column_stack(
+        [numpy.arange(1, counts.shape[0] + 1), counts, nlea, ntax]
     )
-    stax = sorted([x.label for x in stax])
 
-    with open(args.output, "aw") as fo:
+    with iotools.open_output(args.output, "a") as fo:
         # Write CSV HEADER
         if args.prefix is None:
+            prefix = ""
             fo.write("GENE,")
         else:
             prefix = str(args.prefix + ",")
@@ -36,30 +96,9 @@ def main(args):
             fo.write("NCPY_" + x + ",")
         fo.write("GTRE_NLEA,GTRE_NTAX\n")
 
-        # Compare trees
-        with open(args.ltreelist, "r") as fi:
-            for l, line in enumerate(fi.readlines()):
-                ltax = dendropy.TaxonNamespace()
-                ltre = dendropy.Tree.get(
-                    string=line,
-                    schema="newick",
-                    rooting="force-unrooted",
-                    taxon_namespace=ltax,
-                )
-                ltax = [x.label for x in ltax]
-
-                counter = create_species_counter(stax, ltax)
-
-                fo.write("%s%d," % (prefix, l + 1))
-                nl = 0
-                nx = 0
-                for x in stax:
-                    cr = counter[x]
-                    fo.write("%d," % cr)
-                    nl = nl + cr
-                    if cr > 0:
-                        nx = nx + 1
-                fo.write("%d,%d\n" % (nl, nx))
+        # Write all rows at once
+        row = prefix.replace("%", "%%") + ",".join(["%d"] * table.shape[1])
+        numpy.savetxt(fo, table, fmt=row)
 
 
 if __name__ == "__main__":
@@ -82,7 +121,17 @@ if __name__ == "__main__":
         "-c", "--column", type=str, help="Column labels for prefix ", required=False
     )
     parser.add_argument(
-        "-o", "--output", type=str, help="Output CSV file", required=True
+        "-o",
+        "--output",
+        type=str,
+        help="Output CSV file (or .npy file for the copy-count matrix only)",
+        required=True,
+    )
+    parser.add_argument(
+        "--summary",
+        type=str,
+        help="Output CSV file with copy-count summary for each species",
+        required=False,
     )
 
     main(parser.parse_args())
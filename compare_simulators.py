@@ -0,0 +1,183 @@
+"""
+Compares sequences simulated by INDELible and by simulate_gtr.py (see
+run_indelible.py --engine) for the same parameter rows and gene trees
+
+Both engines are run (or resumed, see run_indelible.py) with the same seed
+into [output]/indelible and [output]/gtr. For each gene, the mean pairwise
+p-distance and the base composition (T, C, A, G) of both alignments are
+written to a CSV file, and the paired differences between the engines are
+summarized on stdout. The exit status is 1 if the mean difference of any
+statistic is more than --threshold standard errors away from zero.
+"""
+import argparse
+import iotools
+import numpy
+import os
+import run_indelible
+import seqtools
+import shutil
+import sys
+
+
+STATS = ["PDIST", "fT", "fC", "fA", "fG"]
+
+
+def alignment_stats(seqs):
+    """
+    Parameters
+    ----------
+    seqs : dict
+           alignment
+
+    Returns
+    -------
+    stats : numpy array (length 5)
+            Mean pairwise p-distance, then the frequencies of T, C, A and G
+            (see STATS)
+    """
+    [nams, dmat] = seqtools.distance_matrix(seqs, model="p")
+    iu = numpy.triu_indices(len(nams), k=1)
+    pdist = numpy.nanmean(dmat[iu])
+
+    [nams, data] = seqtools.to_array(seqs)
+    counts = numpy.bincount(data.ravel(), minlength=256)
+    freqs = counts[numpy.frombuffer(b"TCAG", dtype=numpy.uint8)]
+    freqs = freqs / freqs.sum()
+
+    return numpy.concatenate([[pdist], freqs])
+
+
+def summarize(stats1, stats2):
+    """
+    Summarizes paired differences between two simulators
+
+    Parameters
+    ----------
+    stats1, stats2 : numpy arrays (ngene x 5)
+                     Statistics of each gene (see alignment_stats)
+
+    Returns
+    -------
+    mean1, mean2 : numpy arrays (length 5)
+                   Mean of each statistic across genes
+    diff : numpy array (length 5)
+           Mean difference (stats1 - stats2) across genes
+    tval : numpy array (length 5)
+           Mean difference divided by its standard error (paired t statistic)
+    """
+    d = stats1 - stats2
+    diff = d.mean(axis=0)
+    se = d.std(axis=0, ddof=1) / numpy.sqrt(d.shape[0])
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        tval = numpy.where(se > 0, diff / se, 0.0)
+    return stats1.mean(axis=0), stats2.mean(axis=0), diff, tval
+
+
+def main(args):
+    trees = iotools.LineIndex(args.trees)
+    params = run_indelible.read_params(args.params, args.start, args.end)
+    if len(params) < 2:
+        sys.exit("Need at least two genes to compare simulators!")
+
+    odirs = {}
+    for engine in ["indelible", "gtr"]:
+        odir = os.path.join(args.output, engine)
+        tmpdir = os.path.join(odir, "tmp-%d-%d" % (args.start, args.end))
+        if os.path.exists(tmpdir):
+            shutil.rmtree(tmpdir)
+        os.makedirs(odir, exist_ok=True)
+        failed = run_indelible.run_indelible(
+            args.indelible,
+            params,
+            trees,
+            odir,
+            tmpdir,
+            jobs=args.jobs,
+            seed=args.seed,
+            engine=engine,
+        )
+        if len(failed) > 0:
+            sys.exit("Failed to simulate %d genes with %s!" % (len(failed), engine))
+        odirs[engine] = odir
+
+    pad = len(str(len(trees)))
+    genes = [str(int(x)).zfill(pad) for x in params["GENE"]]
+    stats = {}
+    for engine, odir in odirs.items():
+        stats[engine] = numpy.array(
+            [
+                alignment_stats(seqtools.read_phylip(os.path.join(odir, g + ".phy")))
+                for g in genes
+            ]
+        )
+
+    cfil = args.csv
+    if cfil is None:
+        cfil = os.path.join(args.output, "compare.csv")
+    with iotools.open_output(cfil, "w") as f:
+        f.write(
+            "GENE,"
+            + ",".join(["INDELIBLE_" + x for x in STATS])
+            + ","
+            + ",".join(["GTR_" + x for x in STATS])
+            + "\n"
+        )
+        for g, x, y in zip(genes, stats["indelible"], stats["gtr"]):
+            f.write(
+                "%d,%s\n" % (int(g), ",".join(["%1.6f" % v for v in list(x) + list(y)]))
+            )
+
+    [mean1, mean2, diff, tval] = summarize(stats["indelible"], stats["gtr"])
+    sys.stdout.write("STAT,INDELIBLE,GTR,DIFF,T\n")
+    for k, x in enumerate(STATS):
+        sys.stdout.write(
+            "%s,%1.6f,%1.6f,%1.6f,%1.2f\n" % (x, mean1[k], mean2[k], diff[k], tval[k])
+        )
+    sys.stdout.flush()
+
+    if numpy.any(numpy.abs(tval) > args.threshold):
+        sys.stderr.write("Simulators differ (|T| > %g)!\n" % args.threshold)
+        sys.stderr.flush()
+        os._exit(1)
+
+    os._exit(0)  # CRITICAL ON BLUE WATERS LOGIN NODE
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "-x",
+        "--indelible",
+        type=str,
+        help="Path to INDELible executable",
+        required=True,
+    )
+    parser.add_argument("-s", "--start", type=int, help="Start index", required=True)
+    parser.add_argument("-e", "--end", type=int, help="End index", required=True)
+    parser.add_argument(
+        "-p",
+        "--params",
+        type=str,
+        help="Parameter list file (one row per tree)",
+        required=True,
+    )
+    parser.add_argument("-t", "--trees", type=str, help="Tree list file", required=True)
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="Number of simulations in parallel"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=12345, help="Random seed (for both engines)"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=3.0,
+        help="Largest allowed |mean difference| in standard errors",
+    )
+    parser.add_argument("-c", "--csv", type=str, help="Output CSV file")
+    parser.add_argument(
+        "-o", "--output", type=str, help="Output directory", required=True
+    )
+
+    main(parser.parse_args())
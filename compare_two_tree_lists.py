@@ -1,7 +1,8 @@
 import argparse
 import dendropy
 from dendropy.calculate.treecompare import false_positives_and_negatives
-from itertools import izip
+import iotools
+import quartets
 
 
 def compare_trees(tr1, tr2):
@@ -82,17 +83,25 @@ def compare_trees(tr1, tr2):
     return (nl, ei1, ei2, fn, fp, rf)
 
 
+def format_comparison(nl, ei1, ei2, fn, fp, rf):
+    if rf == "NA":
+        return "%d,%d,%d,%s,%s,%s" % (nl, ei1, ei2, fn, fp, rf)
+    return "%d,%d,%d,%d,%d,%1.6f" % (nl, ei1, ei2, fn, fp, rf)
+
+
 def main(args):
     if args.prefix is None:
         p = ""
     else:
         p = str(args.prefix + ",")
 
-    with open(args.output, "aw") as fo, open(args.index, "r") as fi, open(
-        args.treelist1, "r"
-    ) as f1, open(args.treelist2, "r") as f2:
+    with iotools.open_output(args.output, "a") as fo, iotools.open_input(
+        args.index
+    ) as fi, iotools.open_input(args.treelist1) as f1, iotools.open_input(
+        args.treelist2
+    ) as f2:
 
-        for li, l1, l2 in izip(fi, f1, f2):
+        for li, l1, l2 in zip(fi, f1, f2):
             i = int(li)
 
             taxa = dendropy.TaxonNamespace()
@@ -111,13 +120,10 @@ def main(args):
                 taxon_namespace=taxa,
             )
 
-            [nl, ei1, ei2, fn, fp, rf] = compare_trees(tre1, tre2)
-            if rf == "NA":
-                fo.write("%s%d,%d,%d,%d,%s,%s,%s\n" % (p, i, nl, ei1, ei2, fn, fp, rf))
-            else:
-                fo.write(
-                    "%s%d,%d,%d,%d,%d,%d,%1.6f\n" % (p, i, nl, ei1, ei2, fn, fp, rf)
-                )
+            row = format_comparison(*compare_trees(tre1, tre2))
+            if args.quartets:
+                row += "," + format_comparison(*quartets.quartet_distance(l1, l2))
+            fo.write("%s%d,%s\n" % (p, i, row))
 
 
 if __name__ == "__main__":
@@ -132,6 +138,12 @@ if __name__ == "__main__":
     parser.add_argument(
         "-i", "--index", type=str, help="Index list file", required=True
     )
+    parser.add_argument(
+        "-q",
+        "--quartets",
+        action="store_true",
+        help="Append quartet NL,Q1,Q2,FN,FP,QD to each row of CSV (see quartets.py)",
+    )
     parser.add_argument(
         "-p",
         "--prefix",
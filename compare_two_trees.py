@@ -1,7 +1,9 @@
 import argparse
 import dendropy
 from dendropy.calculate.treecompare import false_positives_and_negatives
+import iotools
 import os
+import quartets
 import sys
 
 
@@ -80,18 +82,36 @@ def compare_trees(tr1, tr2):
     return (nl, ei1, ei2, fn, fp, rf)
 
 
+def format_comparison(nl, ei1, ei2, fn, fp, rf):
+    if rf == "NA":
+        return "%d,%d,%d,%s,%s,%s" % (nl, ei1, ei2, fn, fp, rf)
+    return "%d,%d,%d,%d,%d,%1.6f" % (nl, ei1, ei2, fn, fp, rf)
+
+
 def main(args):
+    newick1 = iotools.read_text(args.tree1)
+    newick2 = iotools.read_text(args.tree2)
+
     tax = dendropy.TaxonNamespace()
     tr1 = dendropy.Tree.get(
-        path=args.tree1, schema="newick", rooting="force-unrooted", taxon_namespace=tax
+        data=newick1,
+        schema="newick",
+        rooting="force-unrooted",
+        taxon_namespace=tax,
     )
 
     tr2 = dendropy.Tree.get(
-        path=args.tree2, schema="newick", rooting="force-unrooted", taxon_namespace=tax
+        data=newick2,
+        schema="newick",
+        rooting="force-unrooted",
+        taxon_namespace=tax,
     )
 
     [nl, ei1, ei2, fn, fp, rf] = compare_trees(tr1, tr2)
-    sys.stdout.write("%d,%d,%d,%d,%d,%1.6f\n" % (nl, ei1, ei2, fn, fp, rf))
+    row = "%d,%d,%d,%d,%d,%1.6f" % (nl, ei1, ei2, fn, fp, rf)
+    if args.quartets:
+        row += "," + format_comparison(*quartets.quartet_distance(newick1, newick2))
+    sys.stdout.write(row + "\n")
     sys.stdout.flush()
     os._exit(0)  # CRITICAL ON BLUE WATERS LOGIN NODE
 
@@ -105,5 +125,11 @@ if __name__ == "__main__":
     parser.add_argument(
         "-t2", "--tree2", type=str, help="Input tree 2 file", required=True
     )
+    parser.add_argument(
+        "-q",
+        "--quartets",
+        action="store_true",
+        help="Append quartet NL,Q1,Q2,FN,FP,QD (see quartets.py)",
+    )
 
     main(parser.parse_args())
@@ -1,6 +1,7 @@
 import argparse
 import dendropy
 from dendropy.calculate.treecompare import false_positives_and_negatives
+import iotools
 import os
 import sys
 
@@ -84,14 +85,13 @@ def compare_trees(tr1, tr2):
 
 
 def main(args):
-    with open(args.stree, "r") as f:
-        snwck = f.read()
+    snwck = iotools.read_text(args.stree)
 
     total_fp = 0
     total_fn = 0
     total_rf = 0
 
-    with open(args.gtreelist, "r") as f:
+    with iotools.open_input(args.gtreelist) as f:
         for l, line in enumerate(f.readlines()):
             taxa = dendropy.TaxonNamespace()
             stre = dendropy.Tree.get(
@@ -28,7 +28,11 @@ ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE.
 """
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 import dendropy
+from functools import partial
+import iotools
+import newicktools
 import os
 import sys
 
@@ -153,11 +157,218 @@ def force_ultrametric(tree):
     sys.stdout.write("Species Tree Height: %f\n" % last)
 
 
+class ArrayTree:
+    """
+    Tree stored as arrays indexed by node (in preorder, root is node 0)
+
+    Attributes
+    ----------
+    parent : list of ints
+             parent of each node (-1 for the root)
+    children : list of lists of ints
+               children of each node
+    labels : list of strings
+             label of each node, as read by dendropy ('' if unlabeled)
+    lengths : list of floats
+              length of the edge above each node (None if not given)
+    rooting : string
+              rooting comment, e.g., [&R] ('' if none)
+    """
+
+    def __init__(self, newick):
+        self.parent = []
+        self.children = []
+        self.labels = []
+        self.lengths = []
+        self.rooting = ""
+
+        node = -1
+        stack = []
+        for m in newicktools.TREE_TOKENS.finditer(newick.strip()):
+            x = m.group(0)
+            label = newicktools.leaf_label(m)
+            if x == "(":
+                stack.append(self._add_node(stack))
+                node = -1
+            elif x == ",":
+                node = -1
+            elif x == ";":
+                break
+            elif x[0] == ")":
+                node = stack.pop()
+                self.labels[node] = newicktools.node_label(x)
+            elif x[0] == "[":
+                if x.upper() in ["[&R]", "[&U]"]:
+                    self.rooting = x.upper()
+            elif x[0] == ":":
+                if node < 0:
+                    node = self._add_node(stack)
+                self.lengths[node] = float(x[1:])
+            elif label is not None:
+                if node < 0:
+                    node = self._add_node(stack)
+                self.labels[node] = label
+
+        if len(self.parent) == 0:
+            raise Exception("Unable to read tree!")
+
+    def _add_node(self, stack):
+        node = len(self.parent)
+        if len(stack) > 0:
+            self.parent.append(stack[-1])
+            self.children[stack[-1]].append(node)
+        else:
+            self.parent.append(-1)
+        self.children.append([])
+        self.labels.append("")
+        self.lengths.append(None)
+        return node
+
+    def as_string(self):
+        """
+        Writes the tree in newick format (as dendropy does)
+        """
+        strs = [None] * len(self.parent)
+        for n in range(len(self.parent) - 1, -1, -1):
+            label = newicktools.escape_label(self.labels[n])
+            if len(self.children[n]) > 0:
+                label = "(" + ",".join([strs[c] for c in self.children[n]]) + ")" + label
+                for c in self.children[n]:
+                    strs[c] = None
+            if self.lengths[n] is not None:
+                label = label + ":" + str(self.lengths[n])
+            strs[n] = label
+
+        if self.rooting == "":
+            return strs[0] + ";"
+        return self.rooting + " " + strs[0] + ";"
+
+
+def fix_tree(newick, constant):
+    """
+    Scales branch lengths and forces a rooted binary tree to be
+    ultrametric in one postorder pass (see scale_branch_lengths and
+    force_ultrametric)
+
+    Parameters
+    ----------
+    newick : string
+             newick string for the species tree
+    constant : float
+               branch length scale factor
+
+    Returns
+    -------
+    newick : string
+             newick string for the fixed species tree
+    height : float
+             height of the fixed species tree
+    """
+    constant = float(constant)
+    tree = ArrayTree(newick)
+    lengths = tree.lengths
+    heights = [0.0] * len(lengths)
+
+    if len(tree.children[0]) != 2:
+        raise Exception("Tree is not binary!")
+
+    # Nodes are numbered in preorder, so children come before parents
+    # when nodes are visited in reverse
+    for n in range(len(lengths) - 1, -1, -1):
+        if lengths[n] is not None:
+            lengths[n] = lengths[n] * constant
+
+        children = tree.children[n]
+        if len(children) == 0:
+            continue
+        if len(children) != 2:
+            raise Exception("Tree is not binary!")
+
+        [c1, c2] = children
+        if lengths[c1] is None or lengths[c2] is None:
+            raise Exception("Tree is missing branch lengths!")
+
+        h1 = lengths[c1] + heights[c1]
+        if h1 != lengths[c2] + heights[c2]:
+            l = lengths[c1] + lengths[c2]
+
+            e1 = (l + heights[c2] - heights[c1]) / 2.0
+            e2 = l - e1
+
+            lengths[c1] = e1
+            lengths[c2] = e2
+
+            h1 = lengths[c1] + heights[c1]
+            if h1 != lengths[c2] + heights[c2]:
+                raise Exception("Unable to force tree to be ultrametric!")
+
+        heights[n] = h1
+
+    return tree.as_string(), heights[0]
+
+
+def fix_trees(newicks, constant):
+    """
+    Fixes a list of species trees (see fix_tree)
+    """
+    return [fix_tree(newick, constant) for newick in newicks]
+
+
+def fix_tree_list(ifil, ofil, constant, jobs=1, chunk=256):
+    """
+    Fixes every species tree in a tree list (one newick string per line)
+
+    Parameters
+    ----------
+    ifil : string
+           input file name
+    ofil : string
+           output file name
+    constant : float
+               branch length scale factor
+    jobs : int
+           number of processes
+    chunk : int
+            number of trees sent to a process at a time
+
+    Returns
+    -------
+    heights : list of floats
+              height of each fixed species tree
+    """
+    with iotools.open_input(ifil) as f:
+        newicks = [line for line in f if line.strip() != ""]
+
+    chunks = [newicks[i : i + chunk] for i in range(0, len(newicks), chunk)]
+    work = partial(fix_trees, constant=constant)
+    if jobs > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            fixed = [x for xs in pool.map(work, chunks) for x in xs]
+    else:
+        fixed = [x for xs in map(work, chunks) for x in xs]
+
+    with iotools.open_output(ofil) as f:
+        f.write("".join([newick + "\n" for newick, height in fixed]))
+
+    return [height for newick, height in fixed]
+
+
 def main(args):
-    tree = dendropy.Tree.get(path=args.input, schema="newick")
+    if args.batch:
+        try:
+            heights = fix_tree_list(args.input, args.output, args.factor, args.jobs)
+        except Exception as e:
+            sys.exit(str(e))
+        sys.stdout.write(
+            "".join(["Species Tree Height: %f\n" % h for h in heights])
+        )
+        os._exit(0)  # CRITICAL ON BLUE WATERS LOGIN NODE
+
+    tree = dendropy.Tree.get(data=iotools.read_text(args.input), schema="newick")
     scale_branch_lengths(tree, args.factor)
     force_ultrametric(tree)
-    tree.write(path=args.output, schema="newick")
+    with iotools.open_output(args.output) as f:
+        tree.write(file=f, schema="newick")
 
     os._exit(0)  # CRITICAL ON BLUE WATERS LOGIN NODE
 
@@ -169,4 +380,13 @@ if __name__ == "__main__":
         "-f", "--factor", type=str, required=True, help="Branch length scale factor"
     )
     parser.add_argument("-o", "--output", type=str, required=True, help="Output file")
+    parser.add_argument(
+        "-b",
+        "--batch",
+        action="store_true",
+        help="Input is a list of trees (one newick string per line)",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="Number of processes (batch mode)"
+    )
     main(parser.parse_args())
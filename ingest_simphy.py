@@ -0,0 +1,151 @@
+"""
+Parses each locus or gene tree generated by SimPhy once and writes all of
+the derived tree files from that one parse, i.e., the outputs of
+
+    relabel_simphy_multrees.py         [prefix]-mult.[suffix]
+    map_species_to_gene_simphy.py      [prefix]-s2g.[suffix]
+                                       [prefix]-s2g-map.txt
+    prepare_for_stag_simphy.py         [prefix]/GeneTrees/[l].txt
+                                       [prefix]/SpeciesMap.txt
+    preprocess_multrees_for_fastrfs.py [prefix]-s2g-for-fastrfs.[suffix]
+      (run on the -s2g files)
+"""
+import argparse
+import dendropy
+import iotools
+import os
+import preprocess_multrees_for_fastrfs
+import taxa
+
+
+def ingest_simphy(ifil, prefix, suffix, jobs=8, bundle=None):
+    """
+    Parameters
+    ----------
+    ifil : string
+           name of input file (one newick string per line)
+    prefix : string
+             prefix of output files (and name of STAG output directory)
+    suffix : string
+             suffix of output tree files
+    jobs : int
+           number of threads writing STAG gene tree files
+    bundle : string
+             archive format (tar, tar.gz or zip) for STAG gene tree files
+             (see prepare_for_stag_simphy.py)
+    """
+    # Make output directory
+    os.mkdir(prefix)
+    if bundle is None:
+        os.mkdir(prefix + "/GeneTrees")
+    else:
+        bundle = prefix + "/GeneTrees." + bundle
+
+    max_ngen = {}
+    g2sm = {}
+    s2bit = taxa.SymbolTable()
+    reps = {}
+
+    with iotools.open_input(ifil) as f, iotools.open_output(
+        prefix + "-mult." + suffix
+    ) as fmult, iotools.open_output(
+        prefix + "-s2g." + suffix
+    ) as fs2g, iotools.open_output(
+        prefix + "-s2g-for-fastrfs." + suffix
+    ) as ffrfs, iotools.FileSetWriter(
+        prefix, jobs=jobs, bundle=bundle
+    ) as fstag:
+        for l, line in enumerate(f):
+            temp = "".join(line.split())
+            tax = dendropy.TaxonNamespace()
+            tree = dendropy.Tree.get(
+                data=temp,
+                schema="newick",
+                rooting="force-unrooted",
+                taxon_namespace=tax,
+            )
+
+            leaves = []
+            for node in tree.postorder_node_iter():
+                if node.is_leaf():
+                    leaves.append(node)
+                else:
+                    # Remove internal node label
+                    node.label = None
+
+            # Write STAG gene tree (with branch lengths)
+            fstag.write(
+                "GeneTrees/" + str(l) + ".txt",
+                tree.as_string(schema="newick")[5:].replace("'", ""),
+            )
+
+            # Remove edge lengths
+            for edge in tree.postorder_edge_iter():
+                edge.length = None
+
+            # Relabel [sid]_[lid]_[gid] to [sid]
+            for node in leaves:
+                node.taxon.label = taxa.simphy_species(node.taxon.label)
+            fmult.write(tree.as_string(schema="newick")[5:])
+
+            # Relabel [sid] to [sid]_[xgen]
+            ngen = {}
+            for node in leaves:
+                species = node.taxon.label
+                try:
+                    ngen[species] += 1
+                except KeyError:
+                    ngen[species] = 1
+                gene = species + "_" + str(ngen[species])
+                node.taxon.label = gene
+                g2sm[gene] = species
+                s2bit.intern(species)
+            fs2g.write(tree.as_string(schema="newick")[5:].replace("'", ""))
+
+            for s in ngen:
+                if max_ngen.get(s, 0) < ngen[s]:
+                    max_ngen[s] = ngen[s]
+
+            # Write FastRFS tree (modifies the tree)
+            ffrfs.write(
+                preprocess_multrees_for_fastrfs.transform_parsed_tree(
+                    tree, g2sm, s2bit, reps
+                )
+            )
+
+    # Write gene to species map
+    with iotools.open_output(prefix + "-s2g-map.txt") as f:
+        for s in max_ngen:
+            ng = max_ngen[s]
+            f.write(s + ":")
+            for g in range(1, ng):
+                f.write(s + "_" + str(g) + ",")
+            f.write(s + "_" + str(ng) + "\n")
+
+    # Write gene to species map for STAG
+    with open(prefix + "/SpeciesMap.txt", "w") as f:
+        for s in max_ngen:
+            f.write(s + "_* " + s + "\n")
+
+
+def main(args):
+    base = iotools.strip_compression(args.input)[0].rsplit(".", 1)
+    ingest_simphy(args.input, base[0], base[1], jobs=args.jobs, bundle=args.bundle)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-i", "--input", type=str, help="Input file", required=True)
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=8, help="Number of writing threads"
+    )
+    parser.add_argument(
+        "-b",
+        "--bundle",
+        type=str,
+        choices=["tar", "tar.gz", "zip"],
+        help="Write STAG gene trees into one archive, GeneTrees.[bundle]",
+    )
+
+    main(parser.parse_args())
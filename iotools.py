@@ -0,0 +1,560 @@
+"""
+Basic routines for reading and writing (possibly compressed) files
+
+Inputs compressed with gzip, zstd, bzip2 or xz are detected from their
+magic bytes and decompressed while streaming; outputs are compressed
+when requested or when the file name ends with a compression suffix.
+"""
+import collections
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+
+
+MAGIC = [
+    (b"\x1f\x8b", "gzip"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+]
+
+SUFFIXES = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+    ".bz2": "bz2",
+    ".xz": "xz",
+}
+
+BUFSIZE = 1 << 20
+
+
+class _PipeReader(io.RawIOBase):
+    """Raw stream over the standard output of a decompression process
+
+    The process is checked when the stream reaches its end or is closed,
+    so a corrupt or truncated input raises instead of reading short.
+    """
+
+    def __init__(self, proc, stderr):
+        self.proc = proc
+        self.stderr = stderr
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.proc.stdout.readinto(b)
+        if n == 0 and len(b) > 0 and not self.eof:
+            self.eof = True
+            self.proc.wait()
+            self._check()
+        return n
+
+    def _check(self):
+        """Raise if the process exited with a nonzero status"""
+        if self.proc.returncode:
+            self.stderr.seek(0)
+            msg = self.stderr.read().decode(errors="replace").strip()
+            raise Exception(
+                "%s exited with status %d%s!\n"
+                % (
+                    " ".join(self.proc.args),
+                    self.proc.returncode,
+                    ": " + msg if msg else "",
+                )
+            )
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            # A process that is still running when the stream is closed
+            # early stops on the broken pipe, which is not an error
+            failed = self.eof or self.proc.poll() is not None
+            self.proc.stdout.close()
+            self.proc.wait()
+            if failed:
+                self._check()
+        finally:
+            self.stderr.close()
+            super().close()
+
+
+def _pipe(cmd):
+    """Open a binary stream over the standard output of a command"""
+    import tempfile
+
+    # Standard error goes to a file, so the process never blocks on it
+    stderr = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=stderr, bufsize=BUFSIZE
+    )
+    return io.BufferedReader(_PipeReader(proc, stderr), buffer_size=BUFSIZE)
+
+
+def checksum(ifil):
+    """Compute the MD5 checksum of a file
+
+    Parameters
+    ----------
+    ifil : str
+        file name
+
+    Returns
+    -------
+    md5 : str
+        hexadecimal digest
+
+    """
+    h = hashlib.md5()
+    with open(ifil, "rb") as f:
+        for block in iter(lambda: f.read(BUFSIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def guess_compression(ifil):
+    """Guess the compression of a file from its first bytes
+
+    Parameters
+    ----------
+    ifil : str
+        file name
+
+    Returns
+    -------
+    compression : 'gzip' | 'zstd' | 'bz2' | 'xz' | None
+
+    """
+    with open(ifil, "rb") as f:
+        head = f.read(6)
+    for magic, name in MAGIC:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def strip_compression(path):
+    """Split a compression suffix from a file name
+
+    Parameters
+    ----------
+    path : str
+        file name
+
+    Returns
+    -------
+    stem : str
+        file name without compression suffix
+    suffix : str
+        compression suffix, e.g., '.gz' ('' if there is none)
+
+    """
+    base, ext = os.path.splitext(path)
+    if ext.lower() in SUFFIXES:
+        return base, ext
+    return path, ""
+
+
+def _decompressor(ifil, compression, threads):
+    """Open a binary stream over the decompressed contents of a file"""
+    if compression == "gzip":
+        pigz = shutil.which("pigz")
+        if pigz is not None and threads != 1:
+            cmd = [pigz, "-dc"]
+            if threads is not None:
+                cmd += ["-p", str(threads)]
+            return _pipe(cmd + [ifil])
+        import gzip
+
+        return gzip.open(ifil, "rb")
+
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            zstd = shutil.which("zstd")
+            if zstd is None:
+                raise Exception(
+                    "Reading zstd files requires zstandard module or zstd!\n"
+                )
+            return _pipe([zstd, "-dcq", ifil])
+        dctx = zstandard.ZstdDecompressor()
+        reader = dctx.stream_reader(open(ifil, "rb"), closefd=True)
+        return io.BufferedReader(reader, buffer_size=BUFSIZE)
+
+    if compression == "bz2":
+        import bz2
+
+        return bz2.open(ifil, "rb")
+
+    if compression == "xz":
+        import lzma
+
+        return lzma.open(ifil, "rb")
+
+    raise Exception("Unknown compression %s!\n" % compression)
+
+
+def open_input(ifil, mode="r", threads=None):
+    """Open a (possibly compressed) file for reading
+
+    Parameters
+    ----------
+    ifil : str
+        file name
+    mode : 'r' | 'rt' | 'rb', option
+        text or binary mode
+    threads : int, option
+        number of decompression threads for gzip files, used when pigz
+        is installed (default lets pigz decide; 1 never uses pigz)
+
+    Returns
+    -------
+    f : file object
+
+    """
+    compression = guess_compression(ifil)
+    if compression is None:
+        if "b" in mode:
+            return open(ifil, "rb", buffering=BUFSIZE)
+        return open(ifil, "r", buffering=BUFSIZE)
+
+    f = _decompressor(ifil, compression, threads)
+    if "b" in mode:
+        return f
+    return io.TextIOWrapper(f)
+
+
+def read_text(ifil):
+    """Read the (possibly compressed) contents of a file into a string"""
+    with open_input(ifil, "r") as f:
+        return f.read()
+
+
+def open_output(ofil, mode="w", compress=None, level=None):
+    """Open a file for writing, compressing the output if requested
+
+    Parameters
+    ----------
+    ofil : str
+        file name
+    mode : 'w' | 'wt' | 'wb' | 'a' | 'at' | 'ab', option
+        text or binary mode; appending to a compressed file adds a new
+        frame (gzip member), which standard tools read transparently
+    compress : None | 'gzip' | 'zstd' | 'bz2' | 'xz', option
+        compression; None uses the suffix of ofil (e.g., '.gz')
+    level : int, option
+        compression level
+
+    Returns
+    -------
+    f : file object
+
+    """
+    if compress is None:
+        compress = SUFFIXES.get(os.path.splitext(ofil)[1].lower())
+
+    fmode = mode.replace("t", "").replace("b", "")
+    if fmode not in ["w", "a"]:
+        raise Exception("Unknown output mode %s!\n" % mode)
+
+    if compress is None:
+        if "b" in mode:
+            return open(ofil, fmode + "b", buffering=BUFSIZE)
+        return open(ofil, fmode, buffering=BUFSIZE)
+
+    if compress == "gzip":
+        import gzip
+
+        f = gzip.open(ofil, fmode + "b", compresslevel=6 if level is None else level)
+    elif compress == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception("Writing zstd files requires the zstandard module!\n")
+        cctx = zstandard.ZstdCompressor(level=3 if level is None else level, threads=-1)
+        f = cctx.stream_writer(open(ofil, fmode + "b"), closefd=True)
+    elif compress == "bz2":
+        import bz2
+
+        f = bz2.open(ofil, fmode + "b", compresslevel=9 if level is None else level)
+    elif compress == "xz":
+        import lzma
+
+        f = lzma.open(ofil, fmode + "b", preset=level)
+    else:
+        raise Exception("Unknown compression %s!\n" % compress)
+
+    if "b" in mode:
+        return f
+    return io.TextIOWrapper(f)
+
+
+def _scan_lines(ifil):
+    """Byte offsets of the start and end of every line of a file"""
+    import numpy
+
+    starts = [numpy.zeros(1, dtype=numpy.int64)]
+    pos = 0
+    with open(ifil, "rb") as f:
+        while True:
+            block = f.read(1 << 24)
+            if not block:
+                break
+            nl = numpy.flatnonzero(numpy.frombuffer(block, dtype=numpy.uint8) == 10)
+            starts.append(nl.astype(numpy.int64) + pos + 1)
+            pos += len(block)
+    starts = numpy.concatenate(starts)
+    if starts[-1] == pos:
+        # File ends with a newline
+        starts = starts[:-1]
+    return numpy.append(starts, pos)
+
+
+def cached_sidecar(ifil, ext, build, save, load):
+    """Build something from a file, cached next to it (ifil + ext)
+
+    The cache is an npz file keyed on the size and modification time of
+    the file, so it is rebuilt when the file changes. It is written under
+    a temporary name and then renamed, so concurrent jobs never see a
+    partial cache; caches that cannot be read or written are ignored.
+
+    Parameters
+    ----------
+    ifil : str
+        file name
+    ext : str
+        suffix of the cache file, e.g., '.idx'
+    build : function
+        builds the result from the file name
+    save : function
+        maps the result to a dict of numpy arrays
+    load : function
+        rebuilds the result from the arrays (a mapping like save returns)
+
+    Returns
+    -------
+    result : whatever build returns
+
+    """
+    import numpy
+
+    stat = os.stat(ifil)
+    key = numpy.array([stat.st_size, stat.st_mtime_ns], dtype=numpy.int64)
+    xfil = ifil + ext
+
+    try:
+        with numpy.load(xfil) as x:
+            if numpy.array_equal(x["key"], key):
+                return load(x)
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+    result = build(ifil)
+    try:
+        tmp = "%s.%d.tmp" % (xfil, os.getpid())
+        with open(tmp, "wb") as f:
+            numpy.savez(f, key=key, **save(result))
+        os.replace(tmp, xfil)
+    except (IOError, OSError):
+        pass
+    return result
+
+
+def line_offsets(ifil):
+    """Index the lines of an uncompressed file
+
+    The index is cached next to the file (ifil + '.idx'), and rebuilt
+    when the size or modification time of the file changes (see
+    cached_sidecar).
+
+    Parameters
+    ----------
+    ifil : str
+        file name
+
+    Returns
+    -------
+    offs : numpy array of int64 (nlines + 1)
+        line i spans bytes offs[i] to offs[i + 1]
+
+    """
+    return cached_sidecar(
+        ifil,
+        ".idx",
+        _scan_lines,
+        lambda offs: {"offs": offs},
+        lambda x: x["offs"],
+    )
+
+
+def _split_lines(text):
+    """Split text into lines (keeping newlines) at '\\n' only, as
+    line_offsets does, rather than at every line boundary splitlines knows
+    """
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [l + "\n" for l in lines]
+    if last != "":
+        lines.append(last)
+    return lines
+
+
+class LineIndex:
+    """Random access to the lines of a (tree list or table) file
+
+    Uncompressed files are indexed with line_offsets and read lazily;
+    compressed files cannot be seeked, so they are read into memory.
+    """
+
+    def __init__(self, ifil):
+        self.ifil = ifil
+        if guess_compression(ifil) is None:
+            self.offs = line_offsets(ifil)
+            self.lines = None
+        else:
+            with open_input(ifil, "rb") as f:
+                self.lines = _split_lines(f.read().decode())
+
+    def __len__(self):
+        if self.lines is not None:
+            return len(self.lines)
+        return len(self.offs) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i = i + len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("line index out of range")
+        return self.read_range(i, i + 1)[0]
+
+    def read_range(self, s, e):
+        """Read lines s to e - 1 (with a single seek)"""
+        s = max(s, 0)
+        e = min(e, len(self))
+        if s >= e:
+            return []
+        if self.lines is not None:
+            return self.lines[s:e]
+        with open(self.ifil, "rb") as f:
+            f.seek(int(self.offs[s]))
+            text = f.read(int(self.offs[e] - self.offs[s])).decode()
+        return _split_lines(text)
+
+
+class FileSetWriter:
+    """Writes many small files under one directory, or into one bundle
+
+    Files are written in batches by a bounded pool of threads, so that
+    the latency of creating files (e.g., on a networked file system) is
+    overlapped; with a bundle (.tar, .tar.gz, .tgz or .zip), the files are
+    instead added to one archive, with their names relative to odir.
+
+    Parameters
+    ----------
+    odir : str
+        output directory (created if needed)
+    jobs : int, option
+        number of writing threads
+    batch : int, option
+        number of files written by a thread at a time
+    bundle : str, option
+        archive file name
+    """
+
+    def __init__(self, odir, jobs=8, batch=64, bundle=None):
+        self.odir = odir
+        self.batch = batch
+        self.pending = []
+        self.futures = collections.deque()
+        self.pool = None
+        self.archive = None
+
+        if bundle is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self.dirs = set()
+            self.jobs = max(jobs, 1)
+            self.pool = ThreadPoolExecutor(self.jobs)
+        elif bundle.endswith(".zip"):
+            import zipfile
+
+            self.archive = zipfile.ZipFile(bundle, "w", zipfile.ZIP_DEFLATED)
+        elif bundle.endswith((".tar", ".tar.gz", ".tgz")):
+            import tarfile
+
+            if bundle.endswith(".tar"):
+                self.archive = tarfile.open(bundle, "w")
+            else:
+                self.archive = tarfile.open(bundle, "w:gz")
+        else:
+            raise Exception("Unknown bundle format %s!\n" % bundle)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, name, text):
+        """Write text to the file odir/name"""
+        data = text.encode()
+        if self.archive is not None:
+            self._add(name, data)
+            return
+
+        # Create directories once, before any thread writes into them
+        path = os.path.join(self.odir, name)
+        parent = os.path.dirname(path)
+        if parent not in self.dirs:
+            os.makedirs(parent, exist_ok=True)
+            self.dirs.add(parent)
+
+        self.pending.append((path, data))
+        if len(self.pending) >= self.batch:
+            self._submit()
+
+    def _add(self, name, data):
+        if hasattr(self.archive, "writestr"):
+            self.archive.writestr(name, data)
+        else:
+            import tarfile
+
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def _submit(self):
+        self.futures.append(self.pool.submit(_write_files, self.pending))
+        self.pending = []
+        # Bound the number of batches in flight
+        while len(self.futures) > 2 * self.jobs:
+            self.futures.popleft().result()
+
+    def close(self):
+        """Finish writing (raises the first error of any thread)"""
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        if self.pool is not None:
+            try:
+                if len(self.pending) > 0:
+                    self._submit()
+                while len(self.futures) > 0:
+                    self.futures.popleft().result()
+            finally:
+                self.pool.shutdown()
+                self.pool = None
+
+
+def _write_files(files):
+    """Write a batch of (path, bytes) pairs"""
+    for path, data in files:
+        with open(path, "wb", buffering=BUFSIZE) as f:
+            f.write(data)
@@ -1,6 +1,8 @@
 import argparse
-import dendropy
+import iotools
+import newicktools
 import sys
+import taxa
 
 
 def map_species_to_genes_simphy(ifil, otre, omap):
@@ -20,37 +22,24 @@ def map_species_to_genes_simphy(ifil, otre, omap):
            name of output file (ASTRAL-multi mapping file)
     """
     max_ngen = {}
-    ostr = ""
 
-    with open(ifil, "r") as f:
-        for line in f.readlines():
-            ngen = {}
+    with iotools.open_input(ifil) as f, iotools.open_output(otre) as fo:
+        for line in f:
             temp = "".join(line.split())
-            taxa = dendropy.TaxonNamespace()
-            tree = dendropy.Tree.get(
-                data=temp,
-                schema="newick",
-                rooting="force-unrooted",
-                taxon_namespace=taxa,
-            )
+            if temp == "":
+                continue
 
-            for node in tree.postorder_node_iter():
-                # Remove edge lengths
-                node.edge.length = None
+            # Number the copies of each species in the order of the leaves
+            ngen = {}
 
-                if node.is_leaf():
-                    # Change leaf label
-                    species = node.taxon.label.split(" ")[0]
-                    try:
-                        ngen[species] += 1
-                    except KeyError:
-                        ngen[species] = 1
-                    node.taxon.label = species + "_" + str(ngen[species])
-                else:
-                    # Remove internal node label
-                    node.label = None
+            def relabel(label):
+                species = taxa.simphy_species(label)
+                ngen[species] = ngen.get(species, 0) + 1
+                return species + "_" + str(ngen[species])
 
-            ostr += tree.as_string(schema="newick")[5:].replace("'", "")
+            # Write multree with re-labeled leaves
+            temp = newicktools.relabel_leaves(temp, relabel)
+            fo.write(temp.replace("'", "") + "\n")
 
             for s in ngen:
                 try:
@@ -60,12 +49,8 @@ def map_species_to_genes_simphy(ifil, otre, omap):
                 except KeyError:
                     max_ngen[s] = ngen[s]
 
-    # Write multrees with re-labeled leaves
-    with open(otre, "w") as f:
-        f.write(ostr)
-
     # Write gene to species map
-    with open(omap, "w") as f:
+    with iotools.open_output(omap) as f:
         for s in max_ngen:
             ng = max_ngen[s]
             f.write(s + ":")
@@ -75,7 +60,7 @@ def map_species_to_genes_simphy(ifil, otre, omap):
 
 
 def main(args):
-    base = args.input.rsplit(".", 1)
+    base = iotools.strip_compression(args.input)[0].rsplit(".", 1)
     prefix = base[0]
     suffix = base[1]
     otre = base[0] + "-s2g." + base[1]
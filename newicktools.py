@@ -0,0 +1,202 @@
+"""
+Basic routines for rewriting newick strings token by token, without
+building trees (output matches dendropy's newick writer)
+"""
+import re
+
+
+# Newick tokens: closing parentheses with an optional internal node label,
+# quoted leaf labels, comments, branch lengths, unquoted leaf labels, and
+# whitespace; other characters, i.e., ( , ; are kept as they are
+NEWICK_TOKENS = re.compile(
+    r"\)\s*(?:'(?:[^']|'')*'|[^(),:;\[\]\s']+)?"
+    r"|'((?:[^']|'')*)'"
+    r"|\[[^\]]*\]"
+    r"|:\s*[^(),:;\[\]\s]*"
+    r"|([^(),:;\[\]\s']+)"
+    r"|\s+"
+)
+
+# Same as NEWICK_TOKENS, but also matching ( , and ; so that a newick
+# string can be parsed token by token
+TREE_TOKENS = re.compile(r"[(,;]|" + NEWICK_TOKENS.pattern)
+
+# Characters that dendropy protects with quotes (in newick strings)
+PROTECTED = re.compile(r"""[()[\]{},;:'"\0\t\n]""")
+
+
+def escape_label(label):
+    """
+    Writes a label as dendropy does, i.e., spaces become underscores, and
+    labels with underscores or special characters are quoted
+
+    Parameters
+    ----------
+    label : string
+
+    Returns
+    -------
+    string
+    """
+    protect = PROTECTED.search(label) is not None
+    if "_" not in label and not protect:
+        return label.replace(" ", "_").replace("\t", "_")
+    if protect or " " in label or "_" in label:
+        return "'" + label.replace("'", "''") + "'"
+    return label
+
+
+def leaf_label(m, preserve_underscores=False):
+    """
+    Reads the leaf label of a token (see NEWICK_TOKENS) as dendropy does,
+    i.e., underscores in unquoted labels are read as spaces (unless
+    preserve_underscores), and None if the token is not a leaf label
+    """
+    [quoted, label] = m.groups()
+    if label is not None:
+        if preserve_underscores:
+            return label
+        return label.replace("_", " ")
+    if quoted is not None:
+        return quoted.replace("''", "'")
+    return None
+
+
+def node_label(token):
+    """
+    Reads the internal node label of a ) token (see NEWICK_TOKENS) as
+    dendropy does ('' if there is none)
+    """
+    label = token[1:].strip()
+    if label[:1] == "'":
+        return label[1:-1].replace("''", "'")
+    return label.replace("_", " ")
+
+
+def relabel_leaves(newick, relabel):
+    """
+    Relabels the leaves of a tree and removes branch lengths, internal node
+    labels and comments
+
+    Parameters
+    ----------
+    newick : string
+             newick string
+    relabel : function
+              maps a leaf label, as read by dendropy (i.e., with underscores
+              in unquoted labels read as spaces), to its new label; called
+              on the leaves in order
+
+    Returns
+    -------
+    newick string (without a newline)
+    """
+
+    def rewrite(m):
+        label = leaf_label(m)
+        if label is not None:
+            return escape_label(relabel(label))
+        if m.group(0)[0] == ")":
+            return ")"
+        return ""
+
+    return NEWICK_TOKENS.sub(rewrite, newick)
+
+
+def leaf_labels(newick):
+    """
+    Lists the leaf labels of a tree (in order)
+
+    Parameters
+    ----------
+    newick : string
+             newick string
+
+    Returns
+    -------
+    labels : list of strings
+             leaf labels as read by dendropy, i.e., with underscores in
+             unquoted labels read as spaces
+    """
+    labels = []
+    for m in NEWICK_TOKENS.finditer(newick):
+        label = leaf_label(m)
+        if label is not None:
+            labels.append(label)
+    return labels
+
+
+def clusters(newick, table):
+    """
+    Computes the clusters of a rooted tree as bitmasks, in one pass
+
+    Parameters
+    ----------
+    newick : string
+             newick string
+    table : dictionary (or taxa.SymbolTable)
+            maps leaf labels, as read by dendropy, to bit positions; leaves
+            with other labels are ignored, which restricts the tree to the
+            leaves in table
+
+    Returns
+    -------
+    masks : list of ints
+            cluster of each internal node (in postorder, so the root is
+            last), i.e., the bits of the leaves below the node
+    """
+    masks = []
+    stack = [0]
+    for m in TREE_TOKENS.finditer(newick):
+        x = m.group(0)
+        if x == "(":
+            stack.append(0)
+        elif x[0] == ")":
+            mask = stack.pop()
+            masks.append(mask)
+            stack[-1] |= mask
+        else:
+            label = leaf_label(m)
+            if label is not None and label in table:
+                stack[-1] |= 1 << table[label]
+    return masks
+
+
+def postorder_nodes(newick, table):
+    """
+    Reads the nodes of a tree, in postorder (so the root is last)
+
+    Parameters
+    ----------
+    newick : string
+             newick string
+    table : dictionary (or taxa.SymbolTable)
+            maps leaf labels, as read by dendropy, to leaf ids
+
+    Returns
+    -------
+    children : list of lists of ints
+               children of each node
+    leaves : list of ints
+             leaf id of each node (-1 for internal nodes and for leaves
+             with labels that are not in table)
+    """
+    children = []
+    leaves = []
+    stack = [[]]
+    for m in TREE_TOKENS.finditer(newick):
+        x = m.group(0)
+        if x == "(":
+            stack.append([])
+        elif x[0] == ")":
+            children.append(stack.pop())
+            leaves.append(-1)
+            stack[-1].append(len(children) - 1)
+        else:
+            label = leaf_label(m)
+            if label is None:
+                continue
+            children.append([])
+            leaves.append(table.get(label, -1))
+            stack[-1].append(len(children) - 1)
+    return children, leaves
@@ -1,57 +1,47 @@
 import argparse
 import dendropy
+import iotools
 import os
 import sys
+import taxa
 
 
-def read_g2s_map(ifil):
-    """
-    Parameters
-    ----------
-    ifil : string
-           name of input gene to species label map file (ASTRAL-multi)
-
-    Returns
-    -------
-    g2sm : python dictionary
-           maps gene labels to species labels
-    """
-    g2sm = {}
-    with open(ifil, "r") as f:
-        for line in f.readlines():
-            [species, genes] = line.split(":")
-            genes = genes.split(",")
-            genes[-1] = genes[-1].replace("\n", "")
-            for gene in genes:
-                g2sm[gene] = species
-    return g2sm
-
-
-def prepare_for_stag(ifil, mfil, odir):
+def prepare_for_stag(ifil, mfil, odir, jobs=8, bundle=None):
     """
 
     Parameters
     ----------
     ifil : string
            name of input file (one newick string per line)
-    odir :
+    odir : string
+           name of output directory
+    jobs : int
+           number of threads writing gene tree files
+    bundle : string
+             archive format (tar, tar.gz or zip) for gene tree files;
+             None writes one file per gene tree into odir/GeneTrees
     """
-    g2sm = read_g2s_map(mfil)
+    g2sm = taxa.read_g2s_map(mfil)
 
     # Make output directory
     os.mkdir(odir)
-    os.mkdir(odir + "/GeneTrees")
+    if bundle is None:
+        os.mkdir(odir + "/GeneTrees")
+    else:
+        bundle = odir + "/GeneTrees." + bundle
 
     species = set()
-    with open(ifil, "r") as f:
-        for l, line in enumerate(f.readlines()):
+    with iotools.open_input(ifil) as f, iotools.FileSetWriter(
+        odir, jobs=jobs, bundle=bundle
+    ) as fo:
+        for l, line in enumerate(f):
             temp = "".join(line.split())
-            taxa = dendropy.TaxonNamespace()
+            tax = dendropy.TaxonNamespace()
             tree = dendropy.Tree.get(
                 data=temp,
                 schema="newick",
                 rooting="force-unrooted",
-                taxon_namespace=taxa,
+                taxon_namespace=tax,
             )
 
             for node in tree.postorder_node_iter():
@@ -62,8 +52,10 @@ def prepare_for_stag(ifil, mfil, odir):
                     node.label = None
 
             # Write gene tree
-            with open(odir + "/GeneTrees/" + str(l) + ".txt", "w") as f:
-                f.write(tree.as_string(schema="newick")[5:].replace("'", ""))
+            fo.write(
+                "GeneTrees/" + str(l) + ".txt",
+                tree.as_string(schema="newick")[5:].replace("'", ""),
+            )
 
     # Write gene to species map
     with open(odir + "/SpeciesMap.txt", "w") as f:
@@ -72,14 +64,26 @@ def prepare_for_stag(ifil, mfil, odir):
 
 
 def main(args):
-    base = args.input.rsplit(".", 1)
-    prepare_for_stag(args.input, args.map, base[0])
+    base = iotools.strip_compression(args.input)[0].rsplit(".", 1)
+    prepare_for_stag(
+        args.input, args.map, base[0], jobs=args.jobs, bundle=args.bundle
+    )
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
     parser.add_argument("-i", "--input", type=str, help="Input file", required=True)
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=8, help="Number of writing threads"
+    )
+    parser.add_argument(
+        "-b",
+        "--bundle",
+        type=str,
+        choices=["tar", "tar.gz", "zip"],
+        help="Write gene trees into one archive, GeneTrees.[bundle]",
+    )
     parser.add_argument("-a", "--map", type=str, help="Input file", required=True)
 
     main(parser.parse_args())
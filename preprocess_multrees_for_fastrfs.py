@@ -1,29 +1,27 @@
 import argparse
+import collections
+from concurrent.futures import ProcessPoolExecutor
 import dendropy
+import iotools
+import itertools
+import newicktools
 import sys
+import taxa
 
 
-def read_g2s_map(ifil):
+def species_index(g2sm):
     """
     Parameters
     ----------
-    ifil : string
-           name of input gene to species label map file (ASTRAL-multi)
+    g2sm : python dictionary
+           maps gene labels to species labels
 
     Returns
     -------
-    g2sm : python dictionary
-           maps gene labels to species labels
+    s2bit : taxa.SymbolTable
+            maps species labels to bit positions (0, 1, 2, ...)
     """
-    g2sm = {}
-    with open(ifil, "r") as f:
-        for line in f.readlines():
-            [species, genes] = line.split(":")
-            genes = genes.split(",")
-            genes[-1] = genes[-1].replace("\n", "")
-            for gene in genes:
-                g2sm[gene] = species
-    return g2sm
+    return taxa.SymbolTable(sorted(set(g2sm.values())))
 
 
 def is_binary(tree):
@@ -35,7 +33,189 @@ def is_binary(tree):
                 sys.exit("Tree is not binary!")
 
 
-def transform_multrees(ifil, mfil, ofil):
+def leaf_order(newick):
+    """
+    Lists the leaf labels of a tree in the order transform_tree visits
+    them, i.e., after the root polytomy (if any) is resolved
+
+    Parameters
+    ----------
+    newick : string
+             newick string without whitespace
+
+    Returns
+    -------
+    labels : list of strings
+    """
+    groups = []
+    depth = 0
+    for m in newicktools.TREE_TOKENS.finditer(newick):
+        x = m.group(0)
+        if x == "(":
+            depth += 1
+            if depth == 1:
+                groups.append([])
+        elif x[0] == ")":
+            depth -= 1
+        elif x == ",":
+            if depth == 1:
+                groups.append([])
+        else:
+            label = newicktools.leaf_label(m, preserve_underscores=True)
+            if label is not None:
+                if depth == 0:
+                    groups.append([])
+                groups[-1].append(label)
+
+    # dendropy resolves (a,b,c) as (c,(a,b)), see resolve_polytomies
+    while len(groups) > 2:
+        groups = groups[2:] + [groups[0] + groups[1]]
+    return [label for group in groups for label in group]
+
+
+def first_genes(ifil, g2sm):
+    """
+    Finds the representative gene for each species, i.e., the first gene
+    copy of the species in the gene tree file
+
+    Parameters
+    ----------
+    ifil : string
+           name of input gene tree file (one newick string per line)
+    g2sm : python dictionary
+           maps gene labels to species labels
+
+    Returns
+    -------
+    reps : python dictionary
+           maps species labels to gene labels
+    """
+    reps = {}
+    with iotools.open_input(ifil) as f:
+        for line in f:
+            for gene in leaf_order("".join(line.split())):
+                reps.setdefault(g2sm[gene], gene)
+    return reps
+
+
+def transform_tree(line, g2sm, s2bit, reps):
+    """
+    Transforms one gene tree for FastRFS as described in FastMulRFS paper
+
+    Parameters
+    ----------
+    line : string
+           newick string for the gene tree
+    g2sm : python dictionary
+           maps gene labels to species labels
+    s2bit : taxa.SymbolTable
+            maps species labels to bit positions (see species_index)
+    reps : python dictionary
+           maps species labels to their representative gene labels;
+           species seen for the first time are added
+
+    Returns
+    -------
+    newick string (with a newline) for the transformed tree, or an empty
+    string if the transformed tree has three leaves or fewer
+    """
+    temp = "".join(line.split())
+    tree = dendropy.Tree.get(
+        data=temp,
+        schema="newick",
+        rooting="force-unrooted",
+        preserve_underscores=True,
+    )
+    return transform_parsed_tree(tree, g2sm, s2bit, reps)
+
+
+def transform_parsed_tree(tree, g2sm, s2bit, reps):
+    """
+    Same as transform_tree, but for a dendropy tree (unrooted, with
+    gene labels as leaf labels), which is modified in place
+    """
+    # Randomly root tree!
+    is_binary(tree)
+    tree.resolve_polytomies(limit=2, update_bipartitions=False)
+
+    # Profiles are bitmasks over the species index, so unions are
+    # ORs and intersections are ANDs
+    nodes = [n for n in tree.preorder_node_iter()]
+    index = {n: i for i, n in enumerate(nodes)}
+    down = [0] * len(nodes)
+    up = [0] * len(nodes)
+
+    # Create down profiles (children come before parents when
+    # preorder is reversed)
+    for i in range(len(nodes) - 1, -1, -1):
+        node = nodes[i]
+        if node.is_leaf():
+            down[i] = 1 << s2bit[g2sm[node.taxon.label]]
+        else:
+            [l, r] = node.child_nodes()
+            down[i] = down[index[l]] | down[index[r]]
+
+    # Create up profiles and contract edges
+    for i, node in enumerate(nodes[1:], 1):
+        p = index[node.parent_node]
+        [pl, pr] = node.parent_node.child_nodes()
+        if node == pl:
+            up[i] = up[p] | down[index[pr]]
+        else:
+            up[i] = up[p] | down[index[pl]]
+
+        if node.is_leaf():
+            gene = node.taxon.label
+            reps.setdefault(g2sm[gene], gene)
+            node.edge.length = 1.0
+        elif down[i] & up[i]:
+            node.edge.length = 0.0
+        else:
+            node.edge.length = 1.0
+
+    tree.collapse_unweighted_edges()
+
+    for edge in tree.edges():
+        edge.length = None
+
+    # Prune leaves
+    for l in tree.leaf_nodes():
+        x = l.taxon.label
+        s = g2sm[x]
+        if x != reps[s]:
+            l.taxon = None
+
+    tree.prune_leaves_without_taxa()
+
+    # Relabel leaves
+    for l in tree.leaf_nodes():
+        x = l.taxon.label
+        l.taxon.label = g2sm[x]
+
+    # Unroot tree
+    tree.is_rooted = False
+    tree.collapse_basal_bifurcation(set_as_unrooted_tree=True)
+
+    if len([l for l in tree.leaf_nodes()]) > 3:
+        return tree.as_string(schema="newick")[5:]
+    return ""
+
+
+# Maps shared with worker processes (see _init_transform_worker)
+_transform_maps = None
+
+
+def _init_transform_worker(g2sm, s2bit, reps):
+    global _transform_maps
+    _transform_maps = (g2sm, s2bit, reps)
+
+
+def _transform_chunk(lines):
+    [g2sm, s2bit, reps] = _transform_maps
+    return [transform_tree(line, g2sm, s2bit, reps) for line in lines]
+
+
+def transform_multrees(ifil, mfil, ofil, jobs=1, chunk=256):
     """
     Creates file for FastRFS as described in FastMulRFS paper
 
@@ -47,114 +227,48 @@ def transform_multrees(ifil, mfil, ofil):
            name of input gene to species label map file (ASTRAL-multi)
     ofil : string
            name of output file (one newick string per line)
+    jobs : int
+           number of processes
+    chunk : int
+            number of trees sent to a process at a time
+
+    Trees are read and written one at a time (or one chunk at a time per
+    process), and only the representative gene of each species is kept,
+    so memory does not grow with the number of trees.
     """
-    ostr = ""
-
-    g2sm = read_g2s_map(mfil)
-    s2gm = {}
-
-    with open(ifil, "r") as f:
-        for line in f.readlines():
-            temp = "".join(line.split())
-            tree = dendropy.Tree.get(
-                data=temp,
-                schema="newick",
-                rooting="force-unrooted",
-                preserve_underscores=True,
-            )
-
-            # Randomly root tree!
-            is_binary(tree)
-            tree.resolve_polytomies(limit=2, update_bipartitions=False)
-
-            # Create down profiles
-            for node in tree.postorder_node_iter():
-                if node.is_leaf():
-                    gene = node.taxon.label
-                    species = g2sm[gene]
-                    node.down_profile = set([species])
-                    try:
-                        s2gm[species] = s2gm[species] + [gene]
-                    except KeyError:
-                        s2gm[species] = [gene]
-                else:
-                    [l, r] = node.child_nodes()
-                    node.down_profile = l.down_profile.union(r.down_profile)
-
-            # Create up profiles
-            nodes = [n for n in tree.preorder_node_iter()]
-            root = tree.seed_node
-            [rootl, rootr] = root.child_nodes()
-            rootl.up_profile = rootr.down_profile
-            rootr.up_profile = rootl.down_profile
-
-            # test = rootl.down_profile.intersection(rootr.down_profile)
-            # if len(test) != 0:
-            #    sys.exit("Duplication at root!")
-
-            for node in nodes:
-                if (node == root) or (node == rootl) or (node == rootr):
-                    pass
-                elif node.is_leaf():
-                    pass
-                else:
-                    p = node.parent_node
-                    [pl, pr] = p.child_nodes()
-                    if node == pl:
-                        x = pr.down_profile
-                    else:
-                        x = pl.down_profile
-                    node.up_profile = p.up_profile.union(x)
-
-            # Contract edges
-            for node in tree.postorder_node_iter():
-                if node == root:
-                    pass
-                elif node.is_leaf():
-                    node.edge.length = 1.0
-                else:
-                    test = node.down_profile.intersection(node.up_profile)
-                    if len(test) != 0:
-                        node.edge.length = 0.0
-                    else:
-                        node.edge.length = 1.0
-
-            tree.collapse_unweighted_edges()
-
-            for edge in tree.edges():
-                edge.length = None
-
-            # Prune leaves
-            for l in tree.leaf_nodes():
-                x = l.taxon.label
-                s = g2sm[x]
-                if x != s2gm[s][0]:
-                    l.taxon = None
-
-            tree.prune_leaves_without_taxa()
-
-            # Relabel leaves
-            for l in tree.leaf_nodes():
-                x = l.taxon.label
-                l.taxon.label = g2sm[x]
-
-            # Unroot tree
-            tree.is_rooted = False
-            tree.collapse_basal_bifurcation(set_as_unrooted_tree=True)
-
-            if len([l for l in tree.leaf_nodes()]) > 3:
-                ostr += tree.as_string(schema="newick")[5:]
-
-    with open(ofil, "w") as f:
-        f.write(ostr)
+    g2sm = taxa.read_g2s_map(mfil)
+    s2bit = species_index(g2sm)
+
+    with iotools.open_input(ifil) as f, iotools.open_output(ofil) as fo:
+        if jobs <= 1:
+            reps = {}
+            for line in f:
+                fo.write(transform_tree(line, g2sm, s2bit, reps))
+            return
+
+        # Representatives depend on all earlier trees, so find them first
+        reps = first_genes(ifil, g2sm)
+
+        chunks = iter(lambda: list(itertools.islice(f, chunk)), [])
+        with ProcessPoolExecutor(
+            jobs, initializer=_init_transform_worker, initargs=(g2sm, s2bit, reps)
+        ) as pool:
+            # Keep a few chunks per process in flight, written in order
+            pending = collections.deque()
+            for lines in chunks:
+                pending.append(pool.submit(_transform_chunk, lines))
+                if len(pending) >= 4 * jobs:
+                    fo.write("".join(pending.popleft().result()))
+            while len(pending) > 0:
+                fo.write("".join(pending.popleft().result()))
 
 
 def main(args):
-    base = args.input.rsplit(".", 1)
+    base = iotools.strip_compression(args.input)[0].rsplit(".", 1)
     prefix = base[0]
     suffix = base[1]
     output = base[0] + "-for-fastrfs." + base[1]
-    transform_multrees(args.input, args.map, output)
+    transform_multrees(args.input, args.map, output, jobs=args.jobs)
 
 
 if __name__ == "__main__":
@@ -162,5 +276,8 @@ if __name__ == "__main__":
 
     parser.add_argument("-i", "--input", type=str, help="Input file", required=True)
     parser.add_argument("-a", "--map", type=str, help="Input file", required=True)
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="Number of processes"
+    )
 
     main(parser.parse_args())
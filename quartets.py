@@ -0,0 +1,232 @@
+"""
+Quartet distance between two trees on (the shared part of) their leaf sets
+
+A quartet ab|cd is resolved at two nodes of a tree: the node where a and b
+are in different subtrees and c and d are in a third subtree, and the node
+where c and d are in different subtrees and a and b are in a third
+subtree. Summing over pairs of nodes (one per tree), the number of
+quartets resolved the same way in both trees can be counted from the
+sizes of the intersections of their subtrees (the shared-subtree table),
+in O(n^2) time and memory for trees with n leaves and bounded degree.
+The table itself is filled row by row in postorder of the first tree.
+"""
+import newicktools
+import numpy
+import taxa
+
+
+def _sides(children, leaves, n):
+    """
+    Subtrees around each internal node of a tree
+
+    Returns
+    -------
+    sizes : numpy array of ints
+            number of (shared) leaves below each node
+    sides : tuple of numpy arrays (ninternal x maximum degree)
+            node, complement flag and size of each subtree around each
+            internal node; the subtree is the cluster of the node or, if the
+            flag is set, its complement (i.e., the subtree above the node)
+    """
+    m = len(children)
+    sizes = numpy.zeros(m, dtype=numpy.int64)
+    for v in range(m):
+        sizes[v] = (leaves[v] >= 0) + sum([sizes[c] for c in children[v]])
+
+    internal = [v for v in range(m) if len(children[v]) > 0]
+    root = m - 1
+    degree = max([len(children[v]) + (v != root) for v in internal])
+    node = numpy.zeros((len(internal), degree), dtype=numpy.int64)
+    comp = numpy.zeros((len(internal), degree), dtype=bool)
+    valid = numpy.zeros((len(internal), degree), dtype=bool)
+    for k, v in enumerate(internal):
+        d = len(children[v])
+        node[k, :d] = children[v]
+        valid[k, :d] = True
+        if v != root:
+            node[k, d] = v
+            comp[k, d] = True
+            valid[k, d] = True
+
+    size = numpy.where(comp, n - sizes[node], sizes[node]) * valid
+    return sizes, (node, comp, size)
+
+
+def _common(children1, leaves1, children2, leaves2, n):
+    """
+    Shared-subtree table, i.e., the number of leaves below both node u of
+    tree 1 and node v of tree 2, in O(m1 m2) time for trees with m1 and m2
+    nodes (both in postorder, see newicktools.postorder_nodes)
+
+    The row of a leaf marks the nodes of tree 2 above the same leaf, and
+    the row of an internal node is the sum of the rows of its children.
+    """
+    m2 = len(children2)
+
+    # In postorder, the nodes below v are first[v], ..., v
+    first = numpy.arange(m2)
+    for v in range(m2):
+        if len(children2[v]) > 0:
+            first[v] = first[children2[v][0]]
+
+    where2 = numpy.full(n, -1)
+    for v in range(m2):
+        if leaves2[v] >= 0:
+            where2[leaves2[v]] = v
+
+    last = numpy.arange(m2)
+    common = numpy.zeros((len(children1), m2), dtype=numpy.int32)
+    for u in range(len(children1)):
+        if leaves1[u] >= 0:
+            p = where2[leaves1[u]]
+            common[u] = (first <= p) & (p <= last)
+        for c in children1[u]:
+            common[u] += common[c]
+    return common
+
+
+def _pairs(z):
+    """
+    Number of pairs of leaves in two different subtrees other than subtree
+    i, for each subtree i (last axis) of each node
+    """
+    tot = z.sum(axis=-1, keepdims=True) - z
+    sq = (z * z).sum(axis=-1, keepdims=True) - z * z
+    return (tot * tot - sq) // 2
+
+
+def resolved_quartets(sides):
+    """
+    Number of quartets resolved by a tree (see _sides)
+    """
+    z = sides[2]
+    return int((_pairs(z) * (z * (z - 1) // 2)).sum() // 2)
+
+
+def shared_quartets(inter, z1, z2, n):
+    """
+    Number of quartets resolved the same way by two trees, counted over
+    pairs of internal nodes
+
+    Parameters
+    ----------
+    inter : numpy array of ints (k1 x d1 x k2 x d2)
+            inter[v1, i, v2, j] is the number of leaves in both subtree i
+            around node v1 of tree 1 and subtree j around node v2 of tree 2
+    z1 : numpy array of ints (k1 x d1)
+         subtree sizes of tree 1
+    z2 : numpy array of ints (k2 x d2)
+         subtree sizes of tree 2
+    n : int
+        number of leaves
+
+    Returns
+    -------
+    twice the number of shared quartets (each is counted at two node pairs)
+    """
+    z1 = z1[:, :, None, None]
+    z2 = z2[None, None, :, :]
+    sq = inter * inter
+
+    # Pairs {a, b} in different subtrees other than i at v1, and in
+    # different subtrees other than j at v2, by inclusion-exclusion
+    tot = n - z1 - z2 + inter
+    rows = ((z1 - inter) ** 2).sum(axis=1, keepdims=True) - (z1 - inter) ** 2
+    cols = ((z2 - inter) ** 2).sum(axis=3, keepdims=True) - (z2 - inter) ** 2
+    both = (
+        sq.sum(axis=(1, 3), keepdims=True)
+        - sq.sum(axis=3, keepdims=True)
+        - sq.sum(axis=1, keepdims=True)
+        + sq
+    )
+    pairs = (tot * tot - rows - cols + both) // 2
+
+    # Pairs {c, d} in subtree i at v1 and subtree j at v2
+    return int((pairs * (inter * (inter - 1) // 2)).sum())
+
+
+def quartet_distance(newick1, newick2, chunk=1 << 22):
+    """
+    Compares two trees on the quartets of their shared leaves
+
+    Parameters
+    ----------
+    newick1 : string
+              newick string for the first tree (typically the model tree)
+    newick2 : string
+              newick string for the second tree (typically the estimated tree)
+    chunk : int
+            maximum number of entries of the shared-subtree table held in
+            memory at a time (besides the node by node table)
+
+    Returns
+    -------
+    nl : int
+         Size of the shared leaf set, i.e., the number of leaves in both trees
+    q1 : int
+         Number of quartets resolved by the first tree (after restricting it
+         to the shared leaf set)
+    q2 : int
+         Number of quartets resolved by the second tree (after restricting it
+         to the shared leaf set)
+    fn : int
+         Number of quartets resolved by the first tree that are not resolved
+         the same way by the second tree
+    fp : int
+         Number of quartets resolved by the second tree that are not resolved
+         the same way by the first tree
+    qd : float
+         Normalized quartet distance (FN+FP)/(2*C(NL,4)), which is the
+         fraction of quartets resolved differently when both trees are binary
+
+    Example
+    -------
+    If tree 1 corresponds to "((A,B),(C,(D,E)));" and tree 2 corresponds to
+    "((A,C),(B,(D,E)));", then the output is "5 5 5 2 2 0.4", because the
+    quartets AB|CD and AB|CE of tree 1 are AC|BD and AC|BE in tree 2.
+    """
+    lb1 = set(newicktools.leaf_labels(newick1))
+    lb2 = set(newicktools.leaf_labels(newick2))
+    table = taxa.SymbolTable(sorted(lb1.intersection(lb2)))
+    n = len(table)
+
+    [children1, leaves1] = newicktools.postorder_nodes(newick1, table)
+    [children2, leaves2] = newicktools.postorder_nodes(newick2, table)
+    if n < 4:
+        return (n, 0, 0, "NA", "NA", "NA")
+
+    [sizes1, sides1] = _sides(children1, leaves1, n)
+    [sizes2, sides2] = _sides(children2, leaves2, n)
+    q1 = resolved_quartets(sides1)
+    q2 = resolved_quartets(sides2)
+    common = _common(children1, leaves1, children2, leaves2, n)
+
+    [node1, comp1, z1] = sides1
+    [node2, comp2, z2] = sides2
+    d1 = node1.shape[1]
+    c1 = comp1[:, :, None, None]
+    c2 = comp2[None, None, :, :]
+    b = sizes2[node2][None, None, :, :]
+    valid2 = (z2 > 0)[None, None, :, :]
+
+    step = max(1, chunk // (d1 * z2.size))
+    shared = 0
+    for s in range(0, node1.shape[0], step):
+        e = min(s + step, node1.shape[0])
+        x = common[node1[s:e, :, None, None], node2[None, None, :, :]]
+        a = sizes1[node1[s:e]][:, :, None, None]
+
+        # Intersections of subtrees that are clusters or complements
+        inter = numpy.where(
+            c1[s:e],
+            numpy.where(c2, n - a - b + x, b - x),
+            numpy.where(c2, a - x, x),
+        )
+        inter = inter * ((z1[s:e] > 0)[:, :, None, None] & valid2)
+        shared += shared_quartets(inter, z1[s:e], z2, n)
+    shared = shared // 2
+
+    fn = q1 - shared
+    fp = q2 - shared
+    qd = (fn + fp) / (2.0 * (n * (n - 1) * (n - 2) * (n - 3) // 24))
+    return (n, q1, q2, fn, fp, qd)
@@ -1,5 +1,7 @@
 import argparse
-import dendropy
+import iotools
+import newicktools
+import taxa
 
 
 def relabel_simphy_multrees(ifil, ofil):
@@ -15,34 +17,20 @@ def relabel_simphy_multrees(ifil, ofil):
     ofil : string
            name of output file (one newick string per line)
     """
-    ostr = ""
-
-    with open(ifil, "r") as f:
-        for line in f.readlines():
+    with iotools.open_input(ifil) as f, iotools.open_output(ofil) as fo:
+        for line in f:
             temp = "".join(line.split())
-            tree = dendropy.Tree.get(
-                data=temp, schema="newick", rooting="force-unrooted"
-            )
-
-            for node in tree.postorder_node_iter():
-                # Remove edge lengths
-                node.edge.length = None
-
-                if node.is_leaf():
-                    # Change leaf label
-                    node.taxon.label = node.taxon.label.split(" ")[0]
-                else:
-                    # Remove internal node label
-                    node.label = None
-
-            ostr += tree.as_string(schema="newick")[5:]
+            if temp == "":
+                continue
 
-    with open(ofil, "w") as f:
-        f.write(ostr)
+            # Change leaf labels, and remove internal node labels and edge
+            # lengths
+            temp = newicktools.relabel_leaves(temp, taxa.simphy_species)
+            fo.write(temp + "\n")
 
 
 def main(args):
-    base = args.input.rsplit(".", 1)
+    base = iotools.strip_compression(args.input)[0].rsplit(".", 1)
     prefix = base[0]
     suffix = base[1]
     output = base[0] + "-mult." + base[1]
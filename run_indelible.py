@@ -1,6 +1,7 @@
 """
 Creates INDELible control file (using parameters from set_indelible_params.py)
-and then runs INDELible; see INDELible tutorial pages here:
+and then runs INDELible (or simulate_gtr.py with --engine gtr); see
+INDELible tutorial pages here:
 http://abacus.gene.ucl.ac.uk/software/indelible/tutorial/NUCLEOTIDE.shtml
 http://abacus.gene.ucl.ac.uk/software/indelible/tutorial/rates.shtml
 
@@ -8,82 +9,363 @@ Written by EKM (molloy.erin.k@gmail.com) in Spring 2018.
 Edited by EKM in Summer 2019.
 """
 import argparse
-from decimal import Decimal
-import dendropy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+import io
+import iotools
+import newicktools
 import numpy
 import pandas
 import os
+import queue
+import re
+import seqtools
+import shutil
+import simulate_gtr
+import subprocess
 import sys
+import threading
+import zipfile
 
 
-def branch_lengths_2_decimals(str_newick_tree):
-    """
-    Replaces branch lengths in scientific notation with decimals taken
-    github.com/ngcrawford/CloudForest/blob/master/cloudforest/phybase.py
-
-    COPY OF LICENSE FILE:
-
-    Copyright (c) 2011, Nick G. Crawford & Brant C. Faircloth
-
-    All rights reserved.
-
-    Redistribution and use in source and binary forms, with or without
-    modification, are permitted provided that the following conditions are met:
-
-    + Redistributions of source code must retain the above copyright notice,
-    this list of conditions and the following disclaimer.
-    + Redistributions in binary form must reproduce the above copyright notice,
-    this list of conditions and the following disclaimer in the documentation
-    and/or other materials provided with the distribution.
-    + Neither the name of the University of California, Boston University, nor
-    the names of its contributors may be used to endorse or promote products
-    derived from this software without specific prior written permission.
-
-    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
-    AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
-    IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
-    ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
-    LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
-    CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
-    SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
-    INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
-    CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
-    ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
-    POSSIBILITY OF SUCH DAMAGE.
-    """
-    colon_s = 0
-    comma_back_paren_s = 0
-    num = ""
-    new_tree = ""
-    for count, char in enumerate(str_newick_tree):
-        if char == ":":
-            colon_s = count
-            continue
-        if char in (")", ","):
-            comma_back_paren_s = 1
-            num = "%1.12f" % Decimal(num)
-            new_tree += ":" + num
-            colon_s = 0
-            num = ""
-        if colon_s != 0:
-            num = num + char
-        if colon_s == 0:
-            new_tree += char
-    new_tree = new_tree.strip("'").strip('"').strip("'")
-    return new_tree
-
-
-def cleanup(tree):
-    for n in tree.preorder_node_iter():
-        if not n.is_leaf():
-            n.label = None
-
-
-def run_indelible(indelible, params, trees, outdir, tmpdir):
+ROOT_LENGTH = re.compile(r":[^(),:;]*;$")
+
+
+def format_length(x):
+    """
+    Writes a branch length as a decimal with 12 digits after the point
+    (INDELible does not accept scientific notation)
+
+    Parameters
+    ----------
+    x : string
+        branch length, e.g., 6.184e-05
+
+    Returns
+    -------
+    string, e.g., 0.000061840000
+    """
+    return "%1.12f" % float(x)
+
+
+def _rewrite_token(m):
+    [quoted, label] = m.groups()
+    if quoted is not None:
+        return quoted.replace(" ", "_")
+    if label is not None:
+        return label
+    x = m.group(0)
+    if x[0] == ")":
+        return ")"
+    if x[0] == ":" and x[1:].strip() != "":
+        return ":" + format_length(x[1:].strip())
+    return ""
+
+
+def prepare_tree(newick):
     """
     Parameters
     ----------
-    indelible : INDELible executable (may need to include full path)
+    newick : string
+             newick string for a rooted gene tree
+
+    Returns
+    -------
+    newick string without internal node labels, comments, quotes, root
+    edge length or whitespace, and with branch lengths written as
+    decimals, as expected by INDELible (see format_length)
+    """
+    tree = newicktools.NEWICK_TOKENS.sub(_rewrite_token, newick.strip())
+    return ROOT_LENGTH.sub(";", tree)
+
+
+def write_control(ofil, batch, seed=None):
+    """
+    Writes INDELible control file for a batch of genes, with one [MODEL],
+    [TREE] and [PARTITIONS] block per gene and one [EVOLVE] line per gene
+
+    Parameters
+    ----------
+    ofil : string
+           Name of control file
+    batch : list of tuples (r, tree, gene)
+            r : pandas series
+                INDELible simulation parameters for the gene (see run_indelible)
+            tree : string
+                   Newick string for the gene tree (see prepare_tree)
+            gene : string
+                   Gene ID (used as the output file name)
+    seed : int
+           INDELible random seed (default is seeded from the clock)
+    """
+    with open(ofil, "w") as f:
+        f.write("[TYPE] NUCLEOTIDE 1\n")
+        if seed is not None:
+            f.write("[SETTINGS]\n  [randomseed] %d\n" % seed)
+        for r, tree, gene in batch:
+            f.write("[MODEL] modelname%s\n" % gene)
+            # [MODEL] GTR CT AT GT AC CG [divide by AG, i.e., AG = 1]
+            f.write(
+                "[submodel] GTR %f %f %f %f %f\n"
+                % (
+                    r["rCT"] / r["rAG"],
+                    r["rAT"] / r["rAG"],
+                    r["rGT"] / r["rAG"],
+                    r["rAC"] / r["rAG"],
+                    r["rCG"] / r["rAG"],
+                )
+            )
+            # [statefreq] T C A G
+            f.write("[statefreq] %f %f %f %f\n" % (r["fT"], r["fC"], r["fA"], r["fG"]))
+            f.write("[rates] 0 %f 0 \n" % r["ALPH"])
+        for r, tree, gene in batch:
+            f.write("[TREE] treename%s  %s\n" % (gene, tree))
+        for r, tree, gene in batch:
+            f.write("[PARTITIONS] partitionname%s\n" % gene)
+            f.write("[treename%s modelname%s %d]\n" % (gene, gene, r["SQLN"]))
+        f.write("[EVOLVE]")
+        for r, tree, gene in batch:
+            f.write(" partitionname%s 1 %s\n" % (gene, gene))
+
+
+def clear_directory(wdir):
+    """
+    Removes all files from a scratch directory
+    """
+    for x in os.scandir(wdir):
+        if x.is_dir(follow_symlinks=False):
+            shutil.rmtree(x.path)
+        else:
+            os.remove(x.path)
+
+
+def simulate_batch(iexec, batch, wdir, outdir, timeout=None, seed=None):
+    """
+    Runs INDELible once for a batch of genes inside a scratch directory
+
+    Parameters
+    ----------
+    iexec : string
+            Full path to INDELible executable (run in place)
+    batch : list of tuples (r, newick, gene)
+            r : pandas series
+                INDELible simulation parameters for the gene (see run_indelible)
+            newick : string
+                     Newick string for the rooted gene tree
+            gene : string
+                   Gene ID (used as the output file name)
+    wdir : string
+           Scratch directory (used by one batch at a time)
+    outdir : string
+             Output directory
+    timeout : float
+              Seconds allowed per gene (the run is killed after timeout
+              times the number of genes in the batch)
+    seed : int
+           Random seed; the run is seeded by seed plus the Gene ID of the
+           first gene in the batch
+
+    Returns
+    -------
+    genes : list of tuples (gene, md5)
+            Gene IDs and checksums of their output files
+
+    Raises an Exception (after clearing the scratch directory) if INDELible
+    times out, exits with an error, or does not write all output files.
+    """
+    batch = [(r, prepare_tree(newick), gene) for r, newick, gene in batch]
+    if seed is not None:
+        seed = seed + int(batch[0][2])
+    write_control(os.path.join(wdir, "control.txt"), batch, seed=seed)
+
+    if timeout is not None:
+        timeout = timeout * len(batch)
+    try:
+        proc = subprocess.run(
+            [iexec],
+            cwd=wdir,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            timeout=timeout,
+        )
+        error = None
+        if proc.returncode != 0:
+            error = "exit status %d" % proc.returncode
+        else:
+            for r, tree, gene in batch:
+                if not os.path.exists(os.path.join(wdir, gene + "_TRUE.phy")):
+                    error = "no output for gene %s" % gene
+                    break
+    except subprocess.TimeoutExpired as e:
+        proc = e
+        error = "timed out after %g seconds" % timeout
+
+    if error is not None:
+        clear_directory(wdir)
+        log = (proc.stdout or b"").decode(errors="replace").strip().split("\n")
+        raise Exception(
+            "INDELible failed (%s) for genes %s!\n%s\n"
+            % (error, ",".join([x[2] for x in batch]), "\n".join(log[-10:]))
+        )
+
+    genes = []
+    for r, tree, gene in batch:
+        # Scratch directory is inside the output directory, so this
+        # rename atomically puts the finished file in place
+        ofil = os.path.join(outdir, gene + ".phy")
+        os.rename(os.path.join(wdir, gene + "_TRUE.phy"), ofil)
+        os.remove(os.path.join(wdir, gene + ".fas"))
+        genes.append((gene, iotools.checksum(ofil)))
+    return genes
+
+
+def read_manifest(mfil):
+    """
+    Parameters
+    ----------
+    mfil : string
+           Manifest file, one line per finished gene: Gene ID and MD5
+           checksum of its output file
+
+    Returns
+    -------
+    done : dictionary
+           maps Gene IDs (ints) to checksums
+    """
+    done = {}
+    if not os.path.exists(mfil):
+        return done
+    with open(mfil, "r") as f:
+        for line in f:
+            words = line.split()
+            # Skip lines cut short by a crash
+            if len(words) == 2 and len(words[1]) == 32:
+                done[int(words[0])] = words[1]
+    return done
+
+
+def is_finished(outdir, gene, done):
+    """
+    Checks if a gene is in the manifest and its output file is intact
+    """
+    ofil = os.path.join(outdir, gene + ".phy")
+    md5 = done.get(int(gene))
+    if md5 is None or not os.path.exists(ofil):
+        return False
+    return iotools.checksum(ofil) == md5
+
+
+def concatenate_genes(alns):
+    """
+    Concatenates gene alignments into a supermatrix, filling in missing
+    sequences with gaps
+
+    Parameters
+    ----------
+    alns : list of dictionaries
+           alignments (in the order of the supermatrix)
+
+    Returns
+    -------
+    cat : dict
+          concatenated alignment
+    """
+    nams = set()
+    for a in alns:
+        nams.update(a)
+
+    pieces = {n: [] for n in nams}
+    for a in alns:
+        nch = len(next(iter(a.values())))
+        for n in nams:
+            pieces[n].append(a.get(n, "-" * nch))
+
+    # Join once per sequence, rather than growing strings gene by gene
+    return {n: "".join(pieces[n]) for n in sorted(nams)}
+
+
+def ingest(genes, outdir, store=None, supermatrix=None, errors=None):
+    """
+    Collects simulated alignments as soon as they are finished
+
+    Parameters
+    ----------
+    genes : queue.Queue
+            Gene IDs whose output files are in outdir, followed by None
+            when all genes were simulated or False when some failed (the
+            supermatrix is then not written)
+    outdir : string
+             Output directory
+    store : string
+            Zip file to which each <gene>.phy is added (genes already in
+            the zip file are skipped)
+    supermatrix : string
+                  Phylip file for the concatenation of all genes (in the
+                  order of their Gene IDs), written once all are ingested
+    errors : list
+             Exceptions raised while ingesting are appended here
+    """
+    done = False
+    try:
+        zf = None
+        if store is not None:
+            try:
+                zf = zipfile.ZipFile(store, "a", compression=zipfile.ZIP_DEFLATED)
+            except zipfile.BadZipFile:
+                sys.stderr.write("WARNING: Replacing unreadable store %s!\n" % store)
+                zf = zipfile.ZipFile(store, "w", compression=zipfile.ZIP_DEFLATED)
+            stored = set(zf.namelist())
+
+        alns = {}
+        while True:
+            gene = genes.get()
+            if gene is None or gene is False:
+                complete = gene is None
+                done = True
+                break
+            ifil = os.path.join(outdir, gene + ".phy")
+            if zf is not None and gene + ".phy" not in stored:
+                zf.write(ifil, gene + ".phy")
+                stored.add(gene + ".phy")
+            if supermatrix is not None:
+                alns[gene] = seqtools.read_phylip(ifil)
+
+        if zf is not None:
+            zf.close()
+        if supermatrix is not None and complete:
+            order = sorted(alns, key=lambda gene: int(gene))
+            cat = concatenate_genes([alns[gene] for gene in order])
+            seqtools.write_phylip(cat, supermatrix)
+    except Exception as e:
+        if errors is not None:
+            errors.append(e)
+        # Keep draining the queue (unless it has ended), so the simulation
+        # is never blocked
+        if not done:
+            while genes.get() not in [None, False]:
+                pass
+
+
+def run_indelible(
+    indelible,
+    params,
+    trees,
+    outdir,
+    tmpdir,
+    jobs=1,
+    batch=1,
+    seed=None,
+    timeout=None,
+    store=None,
+    supermatrix=None,
+    engine="indelible",
+):
+    """
+    Parameters
+    ----------
+    indelible : INDELible executable (may need to include full path);
+                ignored when engine is 'gtr'
     params : pandas dataframe
              Each row has INDELible simulation parameters
                 + GENE: Gene ID
@@ -91,82 +373,211 @@ def run_indelible(indelible, params, trees, outdir, tmpdir):
                 + rAC, rAG, rAT, CG, CT, GT: GTR transition rate matrix
                 + ALPH: Gamma distribution (across sites rate heterogeneity)
                 + SQLN: Sequence length
-    trees : list of strings
+    trees : list of strings (or iotools.LineIndex)
             Each string is a newick string for a rooted gene tree; trees[i]
-            corresponds to Gene ID i (from params)
+            corresponds to row i of the parameter table (from params)
     outdir : string
              Output directory (may need to include full path)
     tmpdir : string
-             Temporary directory (may need to include full path)
+             Temporary directory (may need to include full path) for the
+             INDELible scratch directories; not created with engine gtr
+    jobs : int
+           Number of INDELible runs at the same time; each worker gets
+           its own scratch directory inside tmpdir
+    batch : int
+            Number of genes simulated by each INDELible run (one control
+            file with a model, tree and partition per gene)
+    seed : int
+           Random seed (INDELible output then also depends on batch)
+    timeout : float
+              Seconds allowed per gene for INDELible
+    store : string
+            Zip file collecting all simulated alignments (see ingest)
+    supermatrix : string
+                  Phylip file for the concatenated alignment (see ingest)
+    engine : 'indelible' | 'gtr'
+             Simulate sequences with INDELible or with simulate_gtr (GTR+Gamma
+             without indels, see compare_simulators.py)
 
     Returns
     -------
-    Nothing, writes output files
+    failed : list of strings
+             Gene IDs that could not be simulated (errors are written to
+             stderr); all other genes have been written to outdir and
+             appended to manifest.txt, and genes already listed there
+             (with an intact output file) are not simulated again
+
+    Raises an Exception if the outputs could not be ingested into store or
+    supermatrix.
     """
-    os.makedirs(tmpdir)
-    os.chdir(tmpdir)
+    if engine not in ["indelible", "gtr"]:
+        raise Exception("Unknown simulation engine %s!\n" % engine)
+    if engine == "indelible" and indelible is None:
+        sys.exit("INDELible executable is required with engine indelible!")
 
-    ipath, iexec = indelible.rsplit("/", 1)
-    os.system("cp " + indelible + " .")
+    if engine == "gtr":
+        # Native simulator is CPU bound, so use processes
+        executor = ProcessPoolExecutor
+        work = partial(simulate_gtr.simulate_batch, outdir=outdir, seed=seed)
+    else:
+        executor = ThreadPoolExecutor
+        iexec = shutil.which(indelible)
+        if iexec is None:
+            sys.exit("Unable to find INDELible executable %s!" % indelible)
+        iexec = os.path.abspath(iexec)
+        os.makedirs(tmpdir)
 
+        # One scratch directory per worker, handed out to one gene at a time
+        wdirs = queue.Queue()
+        for k in range(jobs):
+            wdir = os.path.join(tmpdir, "worker-" + str(k))
+            os.mkdir(wdir)
+            wdirs.put(wdir)
+
+        def work(batch):
+            wdir = wdirs.get()
+            try:
+                return simulate_batch(
+                    iexec, batch, wdir, outdir, timeout=timeout, seed=seed
+                )
+            finally:
+                wdirs.put(wdir)
+
+    # Only simulate genes that are missing or corrupt
+    mfil = os.path.join(outdir, "manifest.txt")
+    done = read_manifest(mfil)
     pad = len(str(len(trees)))
+    genes = []
+    finished = []
     for i, r in params.iterrows():
         gene = str(int(r["GENE"])).zfill(pad)
+        if is_finished(outdir, gene, done):
+            finished.append(gene)
+        else:
+            genes.append((r, trees[i], gene))
 
-        tree = dendropy.Tree.get(
-            string=trees[i],
-            schema="newick",
-            rooting="force-rooted",
-            preserve_underscores=True,
+    # Optional stage that ingests outputs while the simulation is running
+    ingested = None
+    if store is not None or supermatrix is not None:
+        ingested = queue.Queue(maxsize=4 * jobs * batch)
+        errors = []
+        consumer = threading.Thread(
+            target=ingest,
+            args=(ingested, outdir),
+            kwargs={"store": store, "supermatrix": supermatrix, "errors": errors},
         )
-        cleanup(tree)
-        tree = tree.as_string(schema="newick").replace("'", "")
-        tree = branch_lengths_2_decimals(tree)[5:]
+        consumer.start()
+        for gene in finished:
+            ingested.put(gene)
 
-        with open("control.txt", "w") as f:
-            f.write("[TYPE] NUCLEOTIDE 1\n")
-            f.write("[MODEL] modelname\n")
-            # [MODEL] GTR CT AT GT AC CG [divide by AG, i.e., AG = 1]
-            f.write(
-                "[submodel] GTR %f %f %f %f %f\n"
-                % (
-                    r["rCT"] / r["rAG"],
-                    r["rAT"] / r["rAG"],
-                    r["rGT"] / r["rAG"],
-                    r["rAC"] / r["rAG"],
-                    r["rCG"] / r["rAG"],
-                )
+    failed = []
+    with executor(max_workers=jobs) as pool, open(mfil, "a") as fm:
+        futures = {}
+        for k in range(0, len(genes), batch):
+            future = pool.submit(work, genes[k : k + batch])
+            futures[future] = [x[2] for x in genes[k : k + batch]]
+        for future in as_completed(futures):
+            try:
+                finished = future.result()
+            except Exception as e:
+                sys.stderr.write("WARNING: %s" % e)
+                failed += futures[future]
+                continue
+            for gene, md5 in finished:
+                fm.write("%d %s\n" % (int(gene), md5))
+                fm.flush()
+                if ingested is not None:
+                    ingested.put(gene)
+
+    if engine == "indelible":
+        shutil.rmtree(tmpdir)
+
+    if ingested is not None:
+        ingested.put(None if len(failed) == 0 else False)
+        consumer.join()
+        if len(errors) > 0:
+            raise Exception(
+                "Unable to ingest outputs: %s\n" % "\n".join([str(e) for e in errors])
             )
-            # [statefreq] T C A G
-            f.write("[statefreq] %f %f %f %f\n" % (r["fT"], r["fC"], r["fA"], r["fG"]))
-            f.write("[rates] 0 %f 0 \n" % r["ALPH"])
-            f.write("[TREE] treename  " + tree + "\n")
-            f.write("[PARTITIONS] partitionname\n")
-            f.write("[treename modelname %d]\n" % r["SQLN"])
-            f.write("[EVOLVE] partitionname 1 %s\n" % gene)
-        os.system("./" + iexec)
-        os.rename(gene + "_TRUE.phy", gene + ".phy")
-        os.remove(gene + ".fas")
-
-    os.remove(iexec)
-    os.remove("trees.txt")
-    os.remove("control.txt")
-    os.remove("LOG.txt")
-    os.system("mv " + tmpdir + "/*.phy " + outdir)
-    os.system("rm -rf " + tmpdir)
+    return sorted(failed)
 
 
-def main(args):
-    with open(args.trees, "r") as f:
-        trees = [l for l in f]
+def read_params(pfil, start, end):
+    """
+    Reads the rows of the parameter table for genes start to end
 
-    params = pandas.read_csv(args.params)
-    params = params[(params["GENE"] >= args.start) & (params["GENE"] <= args.end)]
+    Parameters
+    ----------
+    pfil : string
+           Parameter list file (see set_indelible_params.py)
+    start : int
+            First Gene ID
+    end : int
+          Last Gene ID
+
+    Returns
+    -------
+    params : pandas dataframe
+             Rows of the parameter table (indexed by row number)
+
+    Gene IDs are normally row numbers (starting at 1), so only those rows
+    are read; otherwise the whole table is read and filtered. Tables saved
+    as numpy arrays (.npz) are loaded whole and filtered.
+    """
+    start = max(start, 1)
+    if pfil.endswith(".npz"):
+        with numpy.load(pfil) as x:
+            params = pandas.DataFrame({k: x[k] for k in x.files})
+        return params[(params["GENE"] >= start) & (params["GENE"] <= end)]
+
+    lines = iotools.LineIndex(pfil)
+    rows = lines.read_range(start, end + 1)
+    params = pandas.read_csv(io.StringIO(lines[0] + "".join(rows)))
+    params.index = range(start - 1, start - 1 + len(rows))
+
+    expected = list(range(start, start + len(rows)))
+    if list(params["GENE"]) != expected:
+        with iotools.open_input(pfil) as f:
+            params = pandas.read_csv(f)
+        params = params[(params["GENE"] >= start) & (params["GENE"] <= end)]
+    return params
+
+
+def main(args):
+    # Tree i is only read when gene i is simulated
+    trees = iotools.LineIndex(args.trees)
+    params = read_params(args.params, args.start, args.end)
 
     tmpdir = args.output + "/" + "tmp-" + str(args.start) + "-" + str(args.end)
 
-    if not os.path.exists(tmpdir):
-        run_indelible(args.indelible, params, trees, args.output, tmpdir)
+    if os.path.exists(tmpdir):
+        sys.stderr.write("WARNING: Removing %s from an earlier run!\n" % tmpdir)
+        shutil.rmtree(tmpdir)
+
+    try:
+        failed = run_indelible(
+            args.indelible,
+            params,
+            trees,
+            args.output,
+            tmpdir,
+            jobs=args.jobs,
+            batch=args.batch,
+            seed=args.seed,
+            timeout=args.timeout,
+            store=args.store,
+            supermatrix=args.supermatrix,
+            engine=args.engine,
+        )
+    except Exception as e:
+        sys.stderr.write(str(e))
+        sys.stderr.flush()
+        os._exit(1)
+
+    if len(failed) > 0:
+        sys.stderr.write("Failed to simulate %d genes!\n" % len(failed))
+        sys.stderr.flush()
+        os._exit(1)
 
     os._exit(0)  # CRITICAL ON BLUE WATERS LOGIN NODE
 
@@ -178,8 +589,15 @@ if __name__ == "__main__":
         "-x",
         "--indelible",
         type=str,
-        help="Path to INDELible executable",
-        required=True,
+        help="Path to INDELible executable (required with --engine indelible)",
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["indelible", "gtr"],
+        default="indelible",
+        help="Simulate sequences with INDELible or under GTR+Gamma without "
+        "indels (simulate_gtr.py)",
     )
     parser.add_argument("-s", "--start", type=int, help="Start index", required=True)
     parser.add_argument("-e", "--end", type=int, help="End index", required=True)
@@ -191,6 +609,34 @@ if __name__ == "__main__":
         required=True,
     )
     parser.add_argument("-t", "--trees", type=str, help="Tree list file", required=True)
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of INDELible runs in parallel",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        type=int,
+        default=1,
+        help="Number of genes per INDELible run (control file)",
+    )
+    parser.add_argument("--seed", type=int, help="Random seed")
+    parser.add_argument(
+        "--timeout", type=float, help="Seconds allowed per gene for INDELible"
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        help="Zip file collecting the alignments as they are simulated",
+    )
+    parser.add_argument(
+        "--supermatrix",
+        type=str,
+        help="Phylip file for the concatenated alignment of all genes",
+    )
     parser.add_argument(
         "-o", "--output", type=str, help="Output directory", required=True
     )
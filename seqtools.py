@@ -6,6 +6,8 @@ Written by EKM (molloy.erin.k@gmail.com) in October 2016.
 import os
 import sys
 
+import iotools
+
 
 def parse_text(text, skey, ekey):
     """Extract text between start key and end key
@@ -30,6 +32,59 @@ def parse_text(text, skey, ekey):
         return text[s:e]
 
 
+def bootstrap(seqs, ofil, nrep=100, seed=None, weights=False, batch=None):
+    """Write bootstrap replicates of an alignment to a single file
+
+    Parameters
+    ----------
+    seqs : dict
+        alignment
+    ofil : str
+        file name
+    nrep : int, option
+        number of bootstrap replicates
+    seed : int, option
+        seed for numpy.random.default_rng (None draws fresh entropy)
+    weights : boolean, option
+        False, write each replicate as a phylip alignment (one after
+               the other, as expected by RAxML/PHYLIP -b style inputs)
+        True, write one line per replicate with the number of times
+              each site was drawn (site-weight vector)
+    batch : int, option
+        number of replicates whose column indices are drawn at once
+        (default keeps each draw under roughly 10^7 indices)
+
+    Returns
+    -------
+    Nothing
+
+    """
+    import numpy
+
+    nams, data = to_array(seqs)
+    nch = data.shape[1]
+    rng = numpy.random.default_rng(seed)
+
+    if batch is None:
+        batch = max(1, 10000000 // max(nch, 1))
+
+    if not weights:
+        [width, out] = _phylip_rows(nams, nch)
+        head = ("%d %d\n" % (len(nams), nch)).encode("ascii")
+
+    with iotools.open_output(ofil, "wb") as f:
+        for b in range(0, nrep, batch):
+            cols = rng.integers(0, nch, size=(min(batch, nrep - b), nch))
+            for idx in cols:
+                if weights:
+                    wts = numpy.bincount(idx, minlength=nch)
+                    f.write((" ".join(map(str, wts.tolist())) + "\n").encode("ascii"))
+                else:
+                    numpy.take(data, idx, axis=1, out=out[:, width:-1])
+                    f.write(head)
+                    f.write(out.tobytes())
+
+
 def concatenate(alns, fill_gaps=True):
     """Concatenate a list of alignments into single alignment
 
@@ -110,8 +165,7 @@ def get_names_from_fasta(ifil, istext=False):
     if istext:
         text = ifil
     else:
-        with open(ifil, "r") as f:
-            text = f.read()
+        text = iotools.read_text(ifil)
 
     lines = text.split(">")
 
@@ -142,7 +196,7 @@ def guess_format(ifil, istext=False):
         text = ifil
         line = text.split("\n")
     else:
-        with open(ifil, "r") as f:
+        with iotools.open_input(ifil, "r") as f:
             line = f.readline().rstrip()
     ws = line.split()
 
@@ -186,7 +240,14 @@ def keep(seqs, nams):
             sys.stdout.write("WARNING: Sequence %s does not exist!" % n)
 
 
-def mask_gaps(seqs, thresh=1.0):
+def _gap_limit(thresh, nseq, absolute):
+    """Number of gaps at which a column is removed"""
+    if absolute:
+        return thresh
+    return thresh * float(nseq)
+
+
+def mask_gaps(seqs, thresh=1.0, absolute=False, chunk=1 << 16):
     """Remove columns in an alignment when a certain fraction of sites
        are gaps
 
@@ -196,6 +257,11 @@ def mask_gaps(seqs, thresh=1.0):
         alignment
     thresh : float between 0 and 1, option
         fraction of gaps needed for column to be removed
+    absolute : boolean, option
+        False, thresh is a fraction of sequences
+        True, thresh is a number of sequences
+    chunk : int, option
+        number of columns processed at once
 
     Returns
     -------
@@ -204,25 +270,164 @@ def mask_gaps(seqs, thresh=1.0):
 
     """
     import numpy
-    from numpy.core.defchararray import startswith
 
-    nams = list(seqs)
-    nseq = len(nams)
+    nams, data = to_array(seqs)
+    nseq, nch = data.shape
+    limit = _gap_limit(thresh, nseq, absolute)
 
-    data = []
-    for n in nams:
-        data.append(list(seqs[n]))
-    data = numpy.array(data)
+    keep = numpy.empty(nch, dtype=bool)
+    for c0 in range(0, nch, chunk):
+        c1 = min(c0 + chunk, nch)
+        ngap = numpy.count_nonzero(data[:, c0:c1] == ord("-"), axis=0)
+        keep[c0:c1] = ngap < limit
 
-    perc = numpy.sum(startswith(data, "-"), axis=0) / float(nseq)
-    cols = numpy.where(perc < thresh)[0]
-    data = data[:, cols]
+    return from_array(nams, data[:, keep])
 
-    algn = {}
-    for i, n in enumerate(nams):
-        algn[n] = "".join(list(data[i, :]))
 
-    return algn
+def _index_rows(ifil):
+    """Locate the sequences of an uncompressed fasta or phylip file
+
+    Each sequence must be on a single line. Returns the format, the
+    sequence names, the byte offset of the first character of each
+    sequence, the number of characters, and a uint8 view of the memory
+    mapped file (None if the file cannot be indexed this way).
+    """
+    import mmap
+    import numpy
+
+    fmt = guess_format(ifil)
+    if fmt not in ["fasta", "phylip"] or iotools.guess_compression(ifil):
+        return None
+
+    with open(ifil, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    nams = []
+    offs = []
+    nch = None
+    size = len(mm)
+    pos = 0
+    if fmt == "phylip":
+        pos = mm.find(b"\n") + 1
+        nch = int(mm[:pos].split()[1])
+
+    while pos < size:
+        end = mm.find(b"\n", pos)
+        if end == -1:
+            end = size
+        if fmt == "fasta":
+            if mm[pos : pos + 1] != b">":
+                # Sequence spans multiple lines
+                return None
+            n = mm[pos + 1 : end].decode("ascii").strip()
+            pos = end + 1
+            end = mm.find(b"\n", pos)
+            if end == -1:
+                end = size
+            s = pos
+        else:
+            s = mm.find(b" ", pos, end)
+            if s == -1:
+                if mm[pos:end].strip() != b"":
+                    # Interleaved phylip
+                    return None
+                pos = end + 1
+                continue
+            n = mm[pos:s].decode("ascii")
+            while s < end and mm[s : s + 1] == b" ":
+                s = s + 1
+            if n == "":
+                pos = end + 1
+                continue
+        e = end
+        while e > s and mm[e - 1 : e] in [b"\r", b" "]:
+            e = e - 1
+        if nch is None:
+            nch = e - s
+        if e - s != nch:
+            return None
+        nams.append(n)
+        offs.append(s)
+        pos = end + 1
+
+    return [fmt, nams, offs, nch, numpy.frombuffer(mm, dtype=numpy.uint8)]
+
+
+def mask_gaps_file(
+    ifil, ofil, thresh=1.0, absolute=False, chunk=1 << 22, fmt="phylip"
+):
+    """Remove gapped columns from an alignment file without loading it
+
+    The alignment file is memory mapped. The first pass counts gaps in
+    each column, one block of columns at a time; the second pass writes
+    the retained columns of each sequence, again one block at a time, so
+    memory use does not grow with the size of the alignment. Files that
+    cannot be memory mapped (compressed, nexus, wrapped fasta or
+    interleaved phylip) are masked in memory instead.
+
+    Parameters
+    ----------
+    ifil : str
+        input alignment file
+    ofil : str
+        output alignment file
+    thresh : float between 0 and 1, option
+        fraction of gaps needed for column to be removed
+    absolute : boolean, option
+        False, thresh is a fraction of sequences
+        True, thresh is a number of sequences
+    chunk : int, option
+        number of columns processed at once
+    fmt : 'fasta' | 'phylip' | 'nexus', option
+        output format (default is phylip, as for the other outputs)
+
+    Returns
+    -------
+    Nothing
+
+    """
+    import numpy
+
+    if fmt is None:
+        fmt = "phylip"
+
+    index = _index_rows(ifil)
+    if index is None or fmt == "nexus":
+        algn = mask_gaps(read(ifil), thresh=thresh, absolute=absolute)
+        if fmt == "fasta":
+            write_fasta(algn, ofil)
+        elif fmt == "nexus":
+            write_nexus(algn, ofil)
+        else:
+            write_phylip(algn, ofil)
+        return
+
+    [_, nams, offs, nch, mm] = index
+    limit = _gap_limit(thresh, len(nams), absolute)
+
+    # First pass: count gaps in each column
+    keep = numpy.empty(nch, dtype=bool)
+    for c0 in range(0, nch, chunk):
+        c1 = min(c0 + chunk, nch)
+        ngap = numpy.zeros(c1 - c0, dtype=numpy.int64)
+        for o in offs:
+            ngap += mm[o + c0 : o + c1] == ord("-")
+        keep[c0:c1] = ngap < limit
+    nkeep = int(numpy.count_nonzero(keep))
+
+    # Second pass: write retained columns
+    with iotools.open_output(ofil, "wb") as f:
+        if fmt == "phylip":
+            f.write(("%d %d\n" % (len(nams), nkeep)).encode("ascii"))
+        for n, o in zip(nams, offs):
+            if fmt == "fasta":
+                f.write((">" + n + "\n").encode("ascii"))
+            else:
+                f.write((n + " ").encode("ascii"))
+            for c0 in range(0, nch, chunk):
+                c1 = min(c0 + chunk, nch)
+                f.write(mm[o + c0 : o + c1][keep[c0:c1]].tobytes())
+            f.write(b"\n")
 
 
 def read(ifil, istext=False):
@@ -274,8 +479,7 @@ def read_fasta(ifil, istext=False):
     if istext:
         text = ifil
     else:
-        with open(ifil, "r") as f:
-            text = f.read()
+        text = iotools.read_text(ifil)
 
     lines = text.split(">")
 
@@ -312,8 +516,7 @@ def read_nexus(ifil, istext=False):
     if istext:
         text = ifil
     else:
-        with open(ifil, "r") as f:
-            text = f.read()
+        text = iotools.read_text(ifil)
 
     nsq = int(parse_text(text, "ntax=", " "))
     nch = int(parse_text(text, "nchar=", ";"))
@@ -361,8 +564,7 @@ def read_phylip(ifil, istext=False):
     if istext:
         text = ifil
     else:
-        with open(ifil, "r") as f:
-            text = f.read()
+        text = iotools.read_text(ifil)
 
     lines = text.split("\n")
 
@@ -370,15 +572,23 @@ def read_phylip(ifil, istext=False):
     nsq = int(tmp[0])
     nch = int(tmp[1])
 
+    nams = []
+    k = 0
     for s in range(1, len(lines)):
         words = lines[s].split(" ", 1)
-        if len(words) > 1:
+        if len(words) == 1 and words[0] != "" and len(nams) == nsq:
+            # Interleaved phylip, sequence names only in the first block
+            n = nams[k % nsq]
+            k = k + 1
+            seqs[n] = seqs[n] + words[0].replace("\t", "")
+        elif len(words) > 1:
             n = words[0]
             d = words[1].replace(" ", "").replace("\t", "")
             # Important because of INDELible phylip files...
             if n != "":
-                if n not in list(seqs):
+                if n not in seqs:
                     seqs[n] = ""
+                    nams.append(n)
                 seqs[n] = seqs[n] + d
     return seqs
 
@@ -447,7 +657,310 @@ def restrict(seqs, s=None, e=None):
         seqs[n] = seqs[n][s:e]
 
 
-def write_fasta(seqs, ofil):
+def to_array(seqs, nams=None):
+    """Convert sequence data into a character matrix
+
+    Parameters
+    ----------
+    seqs : dict
+        sequence data (all sequences must have the same length)
+    nams : list of str, option
+        order of the rows (default is the order of seqs)
+
+    Returns
+    -------
+    nams : list of str
+        sequence names, one per row
+    data : numpy array of uint8 (nseq x nch)
+        ASCII codes of the aligned characters
+
+    """
+    import numpy
+
+    if nams is None:
+        nams = list(seqs)
+    nseq = len(nams)
+    if nseq == 0:
+        return nams, numpy.zeros((0, 0), dtype=numpy.uint8)
+
+    nch = len(seqs[nams[0]])
+    for n in nams:
+        if len(seqs[n]) != nch:
+            raise Exception("Sequences are not aligned!\n")
+
+    text = "".join([seqs[n] for n in nams]).encode("ascii")
+    data = numpy.frombuffer(text, dtype=numpy.uint8).reshape(nseq, nch)
+    return nams, data
+
+
+def from_array(nams, data):
+    """Convert a character matrix back into sequence data
+
+    Parameters
+    ----------
+    nams : list of str
+        sequence names, one per row
+    data : numpy array of uint8 (nseq x nch)
+        ASCII codes of the aligned characters
+
+    Returns
+    -------
+    seqs : dict
+        sequence data
+
+    """
+    seqs = {}
+    for i, n in enumerate(nams):
+        seqs[n] = data[i, :].tobytes().decode("ascii")
+    return seqs
+
+
+def encode_nucleotides(data):
+    """Encode a character matrix as nucleotide states
+
+    Parameters
+    ----------
+    data : numpy array of uint8 (nseq x nch)
+        ASCII codes of the aligned characters
+
+    Returns
+    -------
+    codes : numpy array of uint8 (nseq x nch)
+        0 = A, 1 = C, 2 = G, 3 = T (or U), and 4 = gap, missing data
+        or ambiguity code
+
+    """
+    import numpy
+
+    lut = numpy.full(256, 4, dtype=numpy.uint8)
+    for k, c in enumerate("ACGT"):
+        lut[ord(c)] = k
+        lut[ord(c.lower())] = k
+    lut[ord("U")] = 3
+    lut[ord("u")] = 3
+    return lut[data]
+
+
+# Character matrix shared with worker processes (see _init_distance_worker)
+_distance_codes = None
+
+
+def _init_distance_worker(codes):
+    global _distance_codes
+    _distance_codes = codes
+
+
+def _count_tile(tile):
+    """Count site patterns between two blocks of rows
+
+    For each pair of rows, the number of sites where both sequences have
+    a nucleotide (v), the number of those sites that differ (d), and the
+    number of differences that are transitions (p) are accumulated using
+    matrix products of 0/1 indicator matrices, one block of columns at a
+    time, so sites with a gap or missing data in either sequence are
+    deleted pairwise.
+    """
+    import numpy
+
+    [i0, i1, j0, j1, block, transitions] = tile
+    codes = _distance_codes
+    nch = codes.shape[1]
+
+    v = numpy.zeros((i1 - i0, j1 - j0))
+    m = numpy.zeros((i1 - i0, j1 - j0))
+    p = numpy.zeros((i1 - i0, j1 - j0))
+
+    for c0 in range(0, nch, block):
+        c1 = min(c0 + block, nch)
+        a = codes[i0:i1, c0:c1]
+        b = codes[j0:j1, c0:c1]
+        xa = [(a == k).astype(numpy.float32) for k in range(4)]
+        xb = [(b == k).astype(numpy.float32) for k in range(4)]
+
+        v += (a < 4).astype(numpy.float32) @ (b < 4).astype(numpy.float32).T
+        for k in range(4):
+            m += xa[k] @ xb[k].T
+        if transitions:
+            # A <-> G and C <-> T
+            p += xa[0] @ xb[2].T + xa[2] @ xb[0].T
+            p += xa[1] @ xb[3].T + xa[3] @ xb[1].T
+
+    return [v, v - m, p]
+
+
+def _distance_tile(tile):
+    """Distances between two blocks of rows (see _count_tile)
+
+    Counts are converted to distances within the tile, so only the
+    (tile x tile) distances are returned to the caller.
+    """
+    import numpy
+
+    [i0, i1, j0, j1, block, model] = tile
+    [v, d, p] = _count_tile([i0, i1, j0, j1, block, model == "k2p"])
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        if model == "p":
+            dt = d / v
+        elif model == "jc69":
+            x = 1.0 - (4.0 / 3.0) * (d / v)
+            dt = -0.75 * numpy.log(numpy.where(x > 0, x, 0.0))
+        else:
+            tp = p / v
+            tq = (d - p) / v
+            x = 1.0 - 2.0 * tp - tq
+            y = 1.0 - 2.0 * tq
+            dt = -0.5 * numpy.log(numpy.where(x > 0, x, 0.0)) - 0.25 * numpy.log(
+                numpy.where(y > 0, y, 0.0)
+            )
+    dt[v == 0] = numpy.nan
+
+    return (i0, i1, j0, j1, dt)
+
+
+def distance_matrix(seqs, model="p", nams=None, tile=512, block=4096, jobs=1):
+    """Compute pairwise distances between aligned nucleotide sequences
+
+    Parameters
+    ----------
+    seqs : dict
+        alignment
+    model : 'p' | 'jc69' | 'k2p', option
+        p-distance, Jukes-Cantor (1969) distance, or Kimura (1980)
+        two-parameter distance
+    nams : list of str, option
+        order of the rows and columns (default is the order of seqs)
+    tile : int, option
+        number of sequences per tile of the distance matrix
+    block : int, option
+        number of sites processed at once within a tile
+    jobs : int, option
+        number of worker processes (tiles are distributed across workers)
+
+    Returns
+    -------
+    nams : list of str
+        sequence names, one per row/column
+    dmat : numpy array (nseq x nseq)
+        pairwise distances; NaN if two sequences share no sites and inf if
+        the distance correction is undefined (saturation)
+
+    """
+    import numpy
+
+    if model not in ["p", "jc69", "k2p"]:
+        raise Exception("Unknown distance model %s!\n" % model)
+
+    nams, data = to_array(seqs, nams=nams)
+    codes = encode_nucleotides(data)
+    nseq = len(nams)
+
+    tiles = []
+    for i0 in range(0, nseq, tile):
+        for j0 in range(i0, nseq, tile):
+            tiles.append(
+                [i0, min(i0 + tile, nseq), j0, min(j0 + tile, nseq), block, model]
+            )
+
+    # Each tile is written into dmat as soon as it is done, so no full
+    # (nseq x nseq) count matrices are ever held
+    dmat = numpy.empty((nseq, nseq))
+
+    def fill(done):
+        for [i0, i1, j0, j1, dt] in done:
+            dmat[i0:i1, j0:j1] = dt
+            dmat[j0:j1, i0:i1] = dt.T
+
+    if jobs > 1 and len(tiles) > 1:
+        import multiprocessing
+
+        with multiprocessing.Pool(
+            jobs, initializer=_init_distance_worker, initargs=(codes,)
+        ) as pool:
+            fill(pool.imap_unordered(_distance_tile, tiles))
+    else:
+        _init_distance_worker(codes)
+        fill(_distance_tile(t) for t in tiles)
+        _init_distance_worker(None)
+
+    numpy.fill_diagonal(dmat, 0.0)
+
+    return nams, dmat
+
+
+def _phylip_rows(nams, nch):
+    """Preformat phylip rows with names padded to a common width
+
+    Returns a (nseq x width) uint8 matrix whose first columns hold the
+    sequence names followed by a space, whose last column holds the
+    newline, and whose remaining nch columns are left to be filled with
+    the characters of each sequence.
+    """
+    import numpy
+
+    width = max([len(n) for n in nams]) + 1
+    out = numpy.empty((len(nams), width + nch + 1), dtype=numpy.uint8)
+    for i, n in enumerate(nams):
+        out[i, :width] = numpy.frombuffer(n.ljust(width).encode("ascii"), numpy.uint8)
+    out[:, -1] = ord("\n")
+    return [width, out]
+
+
+def write_distance_matrix(nams, dmat, ofil):
+    """Write a distance matrix to file with format phylip (square)
+
+    Parameters
+    ----------
+    nams : list of str
+        sequence names, one per row/column
+    dmat : numpy array (nseq x nseq)
+        pairwise distances
+    ofil : str
+        file name
+
+    Returns
+    -------
+    Nothing
+
+    """
+    lines = ["%d\n" % len(nams)]
+    for i, n in enumerate(nams):
+        lines.append(n + " " + " ".join(["%1.6f" % x for x in dmat[i, :]]) + "\n")
+
+    with iotools.open_output(ofil, "w") as f:
+        f.write("".join(lines))
+
+
+def _write_blocks(f, pieces, size=1 << 24):
+    """Join pieces of bytes into large blocks before writing them"""
+    block = []
+    nbyt = 0
+    for x in pieces:
+        block.append(x)
+        nbyt += len(x)
+        if nbyt >= size:
+            f.write(b"".join(block))
+            block = []
+            nbyt = 0
+    if block:
+        f.write(b"".join(block))
+
+
+def _wrap(seq, width):
+    """Split a sequence (bytes) into newline-terminated lines"""
+    if width is None or width <= 0:
+        return seq + b"\n"
+    lines = [seq[i : i + width] for i in range(0, len(seq), width)]
+    return b"\n".join(lines) + b"\n"
+
+
+def _fasta_pieces(seqs, width):
+    for n in seqs:
+        yield b">" + n.encode("ascii") + b"\n"
+        yield _wrap(seqs[n].encode("ascii"), width)
+
+
+def write_fasta(seqs, ofil, width=None, compress=None):
     """Write sequence data to file with format fasta
 
     Parameters
@@ -456,19 +969,46 @@ def write_fasta(seqs, ofil):
         sequence data
     ofil : str
         file name
+    width : int, option
+        wrap sequences after this many characters (default is one line
+        per sequence)
+    compress : None | 'gzip' | 'zstd', option
+        compress the output file (None compresses according to the
+        suffix of ofil, e.g., '.gz')
 
     Returns
     -------
     Nothing
 
     """
-    with open(ofil, "w") as f:
-        for n in list(seqs):
-            f.write(">" + n + "\n" + seqs[n] + "\n")
+    with iotools.open_output(ofil, "wb", compress=compress) as f:
+        _write_blocks(f, _fasta_pieces(seqs, width))
 
 
-def write_nexus(seqs, ofil):
-    """Write sequence data to file with format fasta
+def _interleaved_pieces(seqs, nam, nch, interleave, fmt, indent=""):
+    """Write sequences in blocks of columns, one row per sequence
+
+    fmt is 'phylip' (names only in the first block, blank line between
+    blocks) or 'nexus' (names in every block).
+    """
+    if interleave is None or interleave <= 0:
+        interleave = max(nch, 1)
+    for s in range(0, nch, interleave):
+        e = min(s + interleave, nch)
+        if s > 0:
+            yield b"\n"
+        for n in nam:
+            if fmt == "nexus":
+                name = indent + n + "    "
+            elif s == 0:
+                name = n + " "
+            else:
+                name = ""
+            yield name.encode("ascii") + seqs[n][s:e].encode("ascii") + b"\n"
+
+
+def write_nexus(seqs, ofil, interleave=None, compress=None):
+    """Write sequence data to file with format nexus
 
     Parameters
     ----------
@@ -476,6 +1016,11 @@ def write_nexus(seqs, ofil):
         sequence data
     ofil : str
         file name
+    interleave : int, option
+        write the matrix in interleaved blocks of this many characters
+    compress : None | 'gzip' | 'zstd', option
+        compress the output file (None compresses according to the
+        suffix of ofil, e.g., '.gz')
 
     Return
     ------
@@ -483,32 +1028,40 @@ def write_nexus(seqs, ofil):
 
     """
     nam = list(seqs)
-    nam = sorted(nam, key=lambda n: int(n))  # Important for PAUP* SVDquartets
+    if all([n.isdigit() for n in nam]):
+        nam = sorted(nam, key=lambda n: int(n))  # Important for PAUP* SVDquartets
     nsq = len(nam)
     nch = len(seqs[nam[0]])
 
-    with open(ofil, "w") as f:
-        f.write("#NEXUS\n\n")
+    head = "#NEXUS\n\n"
+    head += "BEGIN TAXA;\n"
+    head += "    DIMENSIONS NTAX=%d;\n" % nsq
+    head += "    TAXLABELS\n"
+    head += "".join(["        %s\n" % n for n in nam])
+    head += "    ;\n"
+    head += "END;\n\n"
+
+    head += "BEGIN CHARACTERS;\n"
+    head += "    DIMENSIONS NCHAR=%d;\n" % nch
+    if interleave is None:
+        head += "    FORMAT DATATYPE=DNA" + " GAP=-" + " MISSING=?;\n"
+    else:
+        head += "    FORMAT DATATYPE=DNA" + " GAP=-" + " MISSING=?" + " INTERLEAVE;\n"
+    head += "    MATRIX\n"
 
-        f.write("BEGIN TAXA;\n")
-        f.write("    DIMENSIONS NTAX=%d;\n" % nsq)
-        f.write("    TAXLABELS\n")
-        for n in nam:
-            f.write("        %s\n" % n)
-        f.write("    ;\n")
-        f.write("END;\n\n")
-
-        f.write("BEGIN CHARACTERS;\n")
-        f.write("    DIMENSIONS NCHAR=%d;\n" % nch)
-        f.write("    FORMAT DATATYPE=DNA" + " GAP=-" + " MISSING=?;\n")
-        f.write("    MATRIX\n")
-        for n in nam:
-            f.write("        %s    %s\n" % (n, seqs[n]))
-        f.write("    ;\n")
-        f.write("END;\n")
+    tail = "    ;\n"
+    tail += "END;\n"
+
+    with iotools.open_output(ofil, "wb", compress=compress) as f:
+        f.write(head.encode("ascii"))
+        _write_blocks(
+            f,
+            _interleaved_pieces(seqs, nam, nch, interleave, "nexus", indent=" " * 8),
+        )
+        f.write(tail.encode("ascii"))
 
 
-def write_phylip(seqs, ofil):
+def write_phylip(seqs, ofil, interleave=None, compress=None):
     """Write sequence data to file with format phylip
 
     Parameters
@@ -517,6 +1070,11 @@ def write_phylip(seqs, ofil):
         sequence data
     ofil : str
         file name
+    interleave : int, option
+        write the alignment in interleaved blocks of this many characters
+    compress : None | 'gzip' | 'zstd', option
+        compress the output file (None compresses according to the
+        suffix of ofil, e.g., '.gz')
 
     Returns
     -------
@@ -527,16 +1085,33 @@ def write_phylip(seqs, ofil):
     nsq = len(nam)
     nch = len(seqs[nam[0]])
 
-    with open(ofil, "w") as f:
-        f.write("%d %d\n" % (nsq, nch))
-
-        for n in nam:
-            f.write(n + " " + seqs[n] + "\n")
+    with iotools.open_output(ofil, "wb", compress=compress) as f:
+        f.write(("%d %d\n" % (nsq, nch)).encode("ascii"))
+        _write_blocks(f, _interleaved_pieces(seqs, nam, nch, interleave, "phylip"))
 
 
 def main(args):
     out = None
 
+    streamable = (
+        len(args.input) == 1
+        and args.keep is None
+        and not args.restrict
+        and args.bootstrap is None
+        and args.distance is None
+        and args.width is None
+        and args.compress is None
+    )
+    if args.mask is not None and streamable and args.output is not None:
+        mask_gaps_file(
+            args.input[0],
+            args.output,
+            thresh=args.mask,
+            absolute=args.absolute,
+            fmt=args.format or "phylip",
+        )
+        os._exit(0)  # CRITICAL ON BLUE WATERS LOGIN NODE
+
     alns = []
     for ifil in args.input:
         alns.append(read(ifil))
@@ -558,13 +1133,37 @@ def main(args):
     if out is None:
         out = alns[0]
 
-    if args.output is not None:
+    if args.mask is not None:
+        out = mask_gaps(out, thresh=args.mask, absolute=args.absolute)
+
+    if args.bootstrap is not None:
+        if args.output is None:
+            sys.stdout.write("Nothing to write replicates to!")
+            sys.exit(1)
+        bootstrap(
+            out,
+            args.output,
+            nrep=args.bootstrap,
+            seed=args.seed,
+            weights=args.weights,
+        )
+    elif args.distance is not None:
+        if args.output is None:
+            sys.stdout.write("Nothing to write distances to!")
+            sys.exit(1)
+        [nams, dmat] = distance_matrix(out, model=args.distance, jobs=args.jobs)
+        write_distance_matrix(nams, dmat, args.output)
+    elif args.output is not None:
         if args.format == "fasta":
-            write_fasta(out, args.output)
+            write_fasta(out, args.output, width=args.width, compress=args.compress)
         elif args.format == "nexus":
-            write_nexus(out, args.output)
+            write_nexus(
+                out, args.output, interleave=args.width, compress=args.compress
+            )
         else:
-            write_phylip(out, args.output)
+            write_phylip(
+                out, args.output, interleave=args.width, compress=args.compress
+            )
 
     os._exit(0)  # CRITICAL ON BLUE WATERS LOGIN NODE
 
@@ -587,6 +1186,56 @@ if __name__ == "__main__":
     parser.add_argument("-s", "--start", type=int, help="Start position of substring")
     parser.add_argument("-e", "--end", type=int, help="End position of substring")
     parser.add_argument("-f", "--format", type=str, help="Output alignment format")
+    parser.add_argument(
+        "-W",
+        "--width",
+        type=int,
+        help="Line width (fasta) or interleaved block width (phylip/nexus)",
+    )
+    parser.add_argument(
+        "-z",
+        "--compress",
+        type=str,
+        choices=["gzip", "zstd"],
+        help="Compress output alignment file",
+    )
+
+    parser.add_argument(
+        "-d",
+        "--distance",
+        type=str,
+        choices=["p", "jc69", "k2p"],
+        help="Write pairwise distance matrix (phylip) instead of alignment",
+    )
+    parser.add_argument(
+        "-m",
+        "--mask",
+        type=float,
+        help="Remove columns with at least this fraction of gaps",
+    )
+    parser.add_argument(
+        "-a",
+        "--absolute",
+        help="Treat mask threshold as a number of sequences, not a fraction",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-b",
+        "--bootstrap",
+        type=int,
+        help="Write this many bootstrap replicates (phylip) instead of alignment",
+    )
+    parser.add_argument(
+        "-w",
+        "--weights",
+        help="Write bootstrap site-weight vectors instead of replicates",
+        action="store_true",
+    )
+    parser.add_argument("--seed", type=int, help="Random seed for bootstrapping")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="Number of worker processes"
+    )
 
     parser.add_argument(
         "-k", "--keep", type=str, nargs="+", help="Sequence names to keep"
@@ -2,14 +2,183 @@
 Written by Erin Molloy (molloy.erin.k@gmail.com) in Summer 2019.
 """
 import argparse
+import inspect
 import numpy
-import numpy as np
+import iotools
 import os
 import math
-from numpy.random import *
+import types
 
 
-def set_indelible_params(ngens, freqs, rates, dist, args, threshold, sqlen, outf):
+# Genes are drawn in fixed-size blocks, each from its own random stream
+# (spawned from the seed), so any range of genes can be regenerated
+# without drawing the genes before it
+BLOCK = 4096
+
+COLUMNS = [
+    "GENE",
+    "SQLN",
+    "ALPH",
+    "fA",
+    "fC",
+    "fG",
+    "fT",
+    "rAC",
+    "rAG",
+    "rAT",
+    "rCG",
+    "rCT",
+    "rGT",
+]
+
+
+def _rand(rng, *shape):
+    return rng.random(shape if shape else None)
+
+
+def _randn(rng, *shape):
+    return rng.standard_normal(shape if shape else None)
+
+
+def _randint(rng, low, high=None, size=None, dtype=int):
+    return rng.integers(low, high, size, dtype=dtype)
+
+
+def _random_integers(rng, low, high=None, size=None):
+    if high is None:
+        [low, high] = [1, low]
+    return rng.integers(low, high, size, endpoint=True)
+
+
+def _random_sample(rng, size=None):
+    return rng.random(size)
+
+
+# Legacy numpy.random functions (not methods of numpy.random.Generator)
+LEGACY = {
+    "rand": _rand,
+    "randn": _randn,
+    "randint": _randint,
+    "random_integers": _random_integers,
+    "random_sample": _random_sample,
+    "ranf": _random_sample,
+    "sample": _random_sample,
+}
+
+
+class StreamProxy:
+    """
+    Exposes the methods of numpy.random.Generator (lognormal, uniform, ...)
+    as plain functions that draw from whichever stream is current, so that
+    sequence length expressions are evaluated once but drawn per block
+
+    Expressions can also use numpy, np, math and every numpy.random name
+    (as with from numpy.random import *). numpy.random functions, including
+    legacy ones such as randint or randn, draw from the streams, and those
+    that cannot (e.g., seed) raise an error.
+    """
+
+    def __init__(self):
+        self.rng = None
+
+    def namespace(self):
+        names = {}
+        for name in numpy.random.__all__:
+            names[name] = self._unseeded(name)
+        for name in dir(numpy.random.Generator):
+            if not name.startswith("_"):
+                names[name] = self._method(name)
+        for name, f in LEGACY.items():
+            names[name] = self._legacy(f)
+
+        random = types.ModuleType("numpy.random")
+        random.__dict__.update(names)
+        module = types.ModuleType("numpy")
+        module.__dict__.update(vars(numpy))
+        module.random = random
+
+        names.update({"numpy": module, "np": module, "math": math})
+        return names
+
+    def _method(self, name):
+        return lambda *args, **kwargs: getattr(self.rng, name)(*args, **kwargs)
+
+    def _legacy(self, f):
+        return lambda *args, **kwargs: f(self.rng, *args, **kwargs)
+
+    def _unseeded(self, name):
+        def reject(*args, **kwargs):
+            raise Exception(
+                "numpy.random.%s cannot be used in sequence length expressions "
+                "(lengths are drawn from the seeded streams, see --seed)!\n" % name
+            )
+
+        return reject
+
+
+def stream(seed, *key):
+    """
+    Returns a numpy random generator for the stream (seed, key)
+    """
+    return numpy.random.default_rng(numpy.random.SeedSequence(seed, spawn_key=key))
+
+
+def draw_lengths(sqlen, n):
+    """
+    Draws n sequence lengths, in one call if sqlen takes the number of
+    genes as an argument (e.g., lambda n: lognormal(6.5, 0.3, n))
+    """
+    if not callable(sqlen):
+        return numpy.full(n, int(sqlen))
+    try:
+        nargs = len(inspect.signature(sqlen).parameters)
+    except (TypeError, ValueError):
+        nargs = 0
+    if nargs > 0:
+        return numpy.asarray(sqlen(n)).astype(int)
+    return numpy.array([sqlen() for j in range(n)]).astype(int)
+
+
+def draw_block(rng, n, freqs, rates, dist, args, threshold, sqlen):
+    """
+    Draws parameters for n genes
+
+    Returns
+    -------
+    columns : dictionary
+              maps column names (except GENE) to numpy arrays
+    """
+    fmat = rng.dirichlet(freqs, n)
+    rmat = rng.dirichlet(rates, n)
+
+    # Redraw all values below threshold at once, until none are left
+    avec = getattr(rng, dist)(*args, n)
+    redo = numpy.flatnonzero(avec < threshold)
+    while redo.shape[0] > 0:
+        avec[redo] = getattr(rng, dist)(*args, redo.shape[0])
+        redo = redo[avec[redo] < threshold]
+
+    columns = {"SQLN": draw_lengths(sqlen, n), "ALPH": avec}
+    for k, x in enumerate(["fA", "fC", "fG", "fT"]):
+        columns[x] = fmat[:, k]
+    for k, x in enumerate(["rAC", "rAG", "rAT", "rCG", "rCT", "rGT"]):
+        columns[x] = rmat[:, k]
+    return columns
+
+
+def set_indelible_params(
+    ngens,
+    freqs,
+    rates,
+    dist,
+    args,
+    threshold,
+    sqlen,
+    outf,
+    seed=None,
+    start=1,
+    end=None,
+):
     """
     Parameters
     ----------
@@ -21,55 +190,86 @@ def set_indelible_params(ngens, freqs, rates, dist, args, threshold, sqlen, outf
     rates : list of floats (length 6)
             Alpha values (AC, AG, AT, CG, CT, GT) to define a Dirichlet
             distribution from which GTR transition rates will be drawn.
-    alpha : list of floats (length 2)
-            Meanlog and sdlog to define a Lognormal distribution from which
-            alpha (to define a gamma for site rate heterogeneity) will be drawn.
-    sqlen : int
-            Sequence length
+    dist : string
+           Name of numpy.random.Generator method (e.g., lognormal) for the
+           distribution from which alpha (to define a gamma for site rate
+           heterogeneity) will be drawn.
+    args : list of floats
+           Parameters of dist
+    threshold : float
+                Alpha values below threshold are redrawn
+    sqlen : int, callable, or string
+            Sequence length, function returning a sequence length (or an
+            array of n sequence lengths if it takes n as an argument), or
+            python expression for such a function; numpy.random names in
+            the expression draw from the seeded streams (see StreamProxy)
     outf : string
-           output file name
+           output file name (.npz for numpy arrays, otherwise CSV); the
+           .npz table is several times faster to write than CSV, and
+           run_indelible.py reads both
+    seed : int
+           Random seed (None draws fresh entropy)
+    start : int
+            First Gene ID to write
+    end : int
+          Last Gene ID to write (default is ngens); the same seed always
+          gives the same parameters for a gene, whatever the range
 
     Returns
     -------
     Nothing, writes an output file
     """
-    with open(outf, "w") as f:
-        f.write("GENE,SQLN,ALPH,fA,fC,fG,fT,rAC,rAG,rAT,rCG,rCT,rGT\n")
-        fmat = numpy.random.dirichlet((freqs[0], freqs[1], freqs[2], freqs[3]), ngens)
-        rmat = numpy.random.dirichlet(
-            (rates[0], rates[1], rates[2], rates[3], rates[4], rates[5]), ngens
+    if end is None or end > ngens:
+        end = ngens
+    if seed is None:
+        seed = numpy.random.SeedSequence().entropy
+
+    proxy = StreamProxy()
+    if isinstance(sqlen, str):
+        proxy.rng = stream(seed, 0)
+        sqlen = eval(sqlen.replace("λ", "lambda"), proxy.namespace())
+
+    blocks = []
+    for b in range((start - 1) // BLOCK, (end - 1) // BLOCK + 1):
+        s = b * BLOCK + 1
+        e = min(s + BLOCK - 1, ngens)
+        proxy.rng = stream(seed, 1, b)
+        columns = draw_block(
+            proxy.rng, e - s + 1, freqs, rates, dist, args, threshold, sqlen
         )
-        avec = getattr(numpy.random, dist)(*args, ngens)
-        for i in range(avec.shape[0]):
-            while avec[i] < threshold:
-                avec[i] = getattr(numpy.random, dist)(*args)
-        gene = 1
-        for j in range(ngens):
-            fj = fmat[j, :]
-            rj = rmat[j, :]
-            f.write(
-                "%d,%d,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f,%f\n"
-                % (
-                    gene,
-                    sqlen() if callable(sqlen) else sqlen,
-                    avec[j],
-                    fj[0],
-                    fj[1],
-                    fj[2],
-                    fj[3],
-                    rj[0],
-                    rj[1],
-                    rj[2],
-                    rj[3],
-                    rj[4],
-                    rj[5],
-                )
-            )
-            gene = gene + 1
+        columns["GENE"] = numpy.arange(s, e + 1)
+
+        keep = slice(max(start, s) - s, end - s + 1)
+        blocks.append({x: columns[x][keep] for x in COLUMNS})
+
+    table = {}
+    for x in COLUMNS:
+        table[x] = numpy.concatenate([block[x] for block in blocks])
+
+    if outf.endswith(".npz"):
+        numpy.savez(outf, **table)
+    else:
+        write_csv(table, outf)
+
+
+def write_csv(table, outf, chunk=1 << 16):
+    """
+    Writes the parameter table as CSV (as pandas does with float_format
+    '%f'), formatting whole rows with one format string, one chunk of rows
+    at a time
+    """
+    fmt = ["%d" if table[x].dtype.kind in "iu" else "%f" for x in COLUMNS]
+    fmt = ",".join(fmt) + "\n"
+    nrow = table[COLUMNS[0]].shape[0]
+    with iotools.open_output(outf) as f:
+        f.write(",".join(COLUMNS) + "\n")
+        for s in range(0, nrow, chunk):
+            rows = zip(*[table[x][s : s + chunk].tolist() for x in COLUMNS])
+            f.write("".join(map(fmt.__mod__, rows)))
 
 
 def main(args):
-    getattr(numpy.random, args.dist)
+    getattr(numpy.random.Generator, args.dist)
     set_indelible_params(
         args.ngens,
         args.freqs,
@@ -77,8 +277,11 @@ def main(args):
         args.dist,
         args.args,
         args.threshold,
-        eval(args.sqlen.replace("λ", "lambda")),
+        args.sqlen,
         args.output,
+        seed=args.seed,
+        start=args.start,
+        end=args.end,
     )
 
     os._exit(0)  # CRITICAL ON BLUE WATERS LOGIN NODE
@@ -116,7 +319,7 @@ if __name__ == "__main__":
         "--dist",
         type=str,
         required=True,
-        help="Dist: distribution, " "for examplenumpy.random.[lognormal]",
+        help="Dist: distribution, " "for example numpy.random.Generator.[lognormal]",
     )
     parser.add_argument(
         "-a",
@@ -142,5 +345,19 @@ if __name__ == "__main__":
     )
     # for example, for ASTRAL-II
     # (λ lm: (λ sg: (λ: lognormal(lm, sg))))(uniform(5.7,7.3))(uniform(0.0,0.3))
-    parser.add_argument("-o", "--output", type=str, required=True, help="Output file")
+    # or, drawing all lengths at once,
+    # (λ lm: (λ sg: (λ n: lognormal(lm, sg, n))))(uniform(5.7,7.3))(uniform(0.0,0.3))
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        required=True,
+        help="Output file (CSV, or numpy arrays if it ends with .npz, which is "
+        "much faster to write for many genes)",
+    )
+    parser.add_argument("--seed", type=int, help="Random seed")
+    parser.add_argument(
+        "--start", type=int, default=1, help="First Gene ID to write (chunking)"
+    )
+    parser.add_argument("--end", type=int, help="Last Gene ID to write (chunking)")
     main(parser.parse_args())
@@ -0,0 +1,182 @@
+"""
+Simulates nucleotide sequences down rooted gene trees under GTR+Gamma
+(continuous gamma, no indels), using the same parameter rows as
+run_indelible.py (see set_indelible_params.py) but without INDELible.
+
+P(t) is computed from one eigendecomposition of the rate matrix per
+gene, and all sites of a gene are evolved together down each branch.
+"""
+import dendropy
+import iotools
+import numpy
+import os
+import seqtools
+
+
+# State order used by INDELible, e.g., [statefreq] T C A G
+STATES = numpy.frombuffer(b"TCAG", dtype=numpy.uint8)
+
+
+def gtr_model(r):
+    """
+    Parameters
+    ----------
+    r : pandas series (or dict)
+        INDELible simulation parameters for one gene (see run_indelible)
+
+    Returns
+    -------
+    pi : numpy array (length 4)
+         Stationary base frequencies (T, C, A, G)
+    lam : numpy array (length 4)
+          Eigenvalues of the rate matrix Q
+    u : numpy array (4 x 4)
+        Right eigenvectors of Q
+    uinv : numpy array (4 x 4)
+           Inverse of u, so that Q = u diag(lam) uinv
+
+    Q is scaled so that branch lengths are expected substitutions per site.
+    """
+    pi = numpy.array([r["fT"], r["fC"], r["fA"], r["fG"]], dtype=float)
+    pi = pi / pi.sum()
+
+    [T, C, A, G] = [0, 1, 2, 3]
+    s = numpy.zeros((4, 4))
+    s[T, C] = r["rCT"]
+    s[T, A] = r["rAT"]
+    s[T, G] = r["rGT"]
+    s[C, A] = r["rAC"]
+    s[C, G] = r["rCG"]
+    s[A, G] = r["rAG"]
+    s = s + s.T
+
+    q = s * pi[None, :]
+    numpy.fill_diagonal(q, -q.sum(axis=1))
+    q = q / -numpy.sum(pi * numpy.diag(q))
+
+    # Q is reversible, so D^(1/2) Q D^(-1/2) is symmetric
+    d = numpy.sqrt(pi)
+    [lam, v] = numpy.linalg.eigh(d[:, None] * q / d[None, :])
+    u = v / d[:, None]
+    uinv = v.T * d[None, :]
+    return pi, lam, u, uinv
+
+
+def evolve(states, t, rates, model, rng):
+    """
+    Evolves sequences along a branch
+
+    Parameters
+    ----------
+    states : numpy array of ints
+             States (0, 1, 2, 3 = T, C, A, G) at the parent node
+    t : float
+        Branch length
+    rates : numpy array of floats
+            Relative rate of each site
+    model : tuple
+            Output of gtr_model
+    rng : numpy random generator
+
+    Returns
+    -------
+    numpy array of ints, states at the child node
+    """
+    [pi, lam, u, uinv] = model
+
+    # Row of P(rate * t) for the parent state of each site
+    p = (u[states, :] * numpy.exp(lam[None, :] * (rates[:, None] * t))) @ uinv
+    cum = numpy.cumsum(numpy.clip(p, 0.0, None), axis=1)
+    x = rng.random(states.shape[0]) * cum[:, -1]
+    return numpy.sum(x[:, None] >= cum[:, :-1], axis=1)
+
+
+def simulate(r, newick, rng=None):
+    """
+    Simulates an alignment for one gene
+
+    Parameters
+    ----------
+    r : pandas series (or dict)
+        INDELible simulation parameters for the gene (see run_indelible)
+    newick : string
+             Newick string for the rooted gene tree
+    rng : numpy random generator
+
+    Returns
+    -------
+    seqs : dict
+           Sequence data, one sequence per leaf (in the order of the tree)
+    """
+    if rng is None:
+        rng = numpy.random.default_rng()
+
+    tree = dendropy.Tree.get(
+        string=newick,
+        schema="newick",
+        rooting="force-rooted",
+        preserve_underscores=True,
+    )
+
+    model = gtr_model(r)
+    nsit = int(r["SQLN"])
+    alph = float(r["ALPH"])
+    if alph > 0:
+        rates = rng.gamma(alph, 1.0 / alph, nsit)
+    else:
+        rates = numpy.ones(nsit)
+
+    seqs = {}
+    for node in tree.preorder_node_iter():
+        if node.parent_node is None:
+            node.states = rng.choice(4, size=nsit, p=model[0])
+        else:
+            t = node.edge.length
+            if t is None:
+                t = 0.0
+            node.states = evolve(node.parent_node.states, t, rates, model, rng)
+
+        if node.is_leaf():
+            seqs[node.taxon.label] = STATES[node.states].tobytes().decode("ascii")
+            node.states = None
+        if node.parent_node is not None:
+            if node is node.parent_node.child_nodes()[-1]:
+                # All children of the parent have been simulated
+                node.parent_node.states = None
+
+    return seqs
+
+
+def simulate_batch(batch, outdir, seed=None):
+    """
+    Simulates a batch of genes and writes one phylip file per gene
+
+    Parameters
+    ----------
+    batch : list of tuples (r, newick, gene)
+            see run_indelible.simulate_batch
+    outdir : string
+             Output directory
+    seed : int
+           Random seed; each gene draws from its own stream seeded by
+           (seed, gene), so results do not depend on batching or jobs
+
+    Returns
+    -------
+    genes : list of tuples (gene, md5)
+            Gene IDs and checksums of their output files
+    """
+    genes = []
+    for r, newick, gene in batch:
+        if seed is None:
+            rng = numpy.random.default_rng()
+        else:
+            rng = numpy.random.default_rng([seed, int(gene)])
+        seqs = simulate(r, newick, rng)
+
+        # Write under a temporary name, then rename into place
+        ofil = os.path.join(outdir, gene + ".phy")
+        seqtools.write_phylip(seqs, ofil + ".tmp")
+        os.replace(ofil + ".tmp", ofil)
+        genes.append((gene, iotools.checksum(ofil)))
+    return genes
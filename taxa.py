@@ -0,0 +1,300 @@
+"""
+Symbol tables mapping taxon (species or gene) labels to dense integer ids,
+and helpers for the labels written by SimPhy
+
+Labels are interned once, so that per-tree work can use integer ids, e.g.,
+as rows or columns of numpy arrays or as bit positions, instead of strings.
+Tables built from a file can be cached next to it (see SymbolTable.cached).
+"""
+import iotools
+import newicktools
+
+
+class SymbolTable:
+    """Dense integer ids (0, 1, 2, ...) for a set of labels
+
+    Parameters
+    ----------
+    labels : iterable of str, option
+        labels to intern (in order)
+    """
+
+    def __init__(self, labels=()):
+        labels = list(labels)
+        self.labels = labels
+        self._index = dict(zip(labels, range(len(labels))))
+        if len(self._index) != len(labels):
+            # Repeated labels keep their first id
+            self.labels = []
+            self._index = {}
+            for x in labels:
+                self.intern(x)
+
+    @classmethod
+    def _unique(cls, labels):
+        """Table of labels known to be unique, indexed on first lookup"""
+        table = cls()
+        table.labels = labels
+        table._index = None
+        return table
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = dict(zip(self.labels, range(len(self.labels))))
+        return self._index
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return label in self.index
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __getitem__(self, label):
+        """Id of a label (KeyError if it was never interned)"""
+        return self.index[label]
+
+    def get(self, label, default=None):
+        """Id of a label (default if it was never interned)"""
+        return self.index.get(label, default)
+
+    def intern(self, label):
+        """Id of a label, adding the label if it is new"""
+        try:
+            return self.index[label]
+        except KeyError:
+            i = len(self.labels)
+            self.index[label] = i
+            self.labels.append(label)
+            return i
+
+    def ids(self, labels):
+        """Ids of a list of labels, as a numpy array"""
+        import numpy
+
+        return numpy.array([self.index[x] for x in labels], dtype=numpy.int64)
+
+    def label(self, i):
+        """Label with id i"""
+        return self.labels[i]
+
+    def _arrays(self):
+        import numpy
+
+        return {"labels": numpy.array(self.labels, dtype=str)}
+
+    @classmethod
+    def _from_arrays(cls, x):
+        return cls._unique(x["labels"].tolist())
+
+    def save(self, ofil):
+        """Save the table as an npz file"""
+        import numpy
+
+        with open(ofil, "wb") as f:
+            numpy.savez(f, **self._arrays())
+
+    @classmethod
+    def load(cls, ifil):
+        """Load a table saved by save"""
+        import numpy
+
+        with numpy.load(ifil) as x:
+            return cls._from_arrays(x)
+
+    @classmethod
+    def cached(cls, ifil, build):
+        """Table built from a file, cached next to it (ifil + '.taxa')
+
+        The cache is rebuilt when the size or modification time of the file
+        changes (see iotools.cached_sidecar).
+
+        Parameters
+        ----------
+        ifil : str
+            file name
+        build : function
+            builds the table (or list of labels) from the file name
+
+        Returns
+        -------
+        table : SymbolTable
+
+        """
+
+        def build_table(ifil):
+            table = build(ifil)
+            if not isinstance(table, cls):
+                table = cls(table)
+            return table
+
+        return iotools.cached_sidecar(
+            ifil, ".taxa", build_table, cls._arrays, cls._from_arrays
+        )
+
+
+def simphy_species(label):
+    """
+    Species of a SimPhy locus or gene tree leaf, i.e., [sid] for the label
+    [sid]_[lid]_[gid] (read by dendropy as '[sid] [lid] [gid]')
+    """
+    return label.split(" ")[0]
+
+
+def simphy_gene(label):
+    """
+    Gene tree label of the first copy of a species or locus, i.e.,
+    [sid]_0_0 for [sid] and [sid]_[lid]_0 for [sid]_[lid] (as read by
+    dendropy), which SimPhy uses when there are no duplications
+    """
+    return label + " 0" * (2 - label.count(" "))
+
+
+def is_lost(label):
+    """
+    Checks if a SimPhy locus tree leaf is a lost lineage (Lost-*)
+    """
+    return label[:5] == "Lost-"
+
+
+def newick_taxa(ifil):
+    """
+    Sorted leaf labels of the trees in a newick file
+    """
+    labels = set()
+    with iotools.open_input(ifil) as f:
+        for line in f:
+            labels.update(newicktools.leaf_labels(line))
+    return sorted(labels)
+
+
+class GeneSpeciesMap:
+    """Gene to species map (ASTRAL-multi) over dense ids
+
+    Attributes
+    ----------
+    genes : SymbolTable
+        gene labels
+    species : SymbolTable
+        species labels (in order of the map file)
+    g2s : numpy array of ints
+        species id of each gene id
+    indptr, indices : numpy arrays of ints
+        species to genes index (CSR), i.e., the gene ids of species j are
+        indices[indptr[j]:indptr[j + 1]] (in order of the map file)
+    """
+
+    def __init__(self, genes, species, g2s, indptr, indices):
+        self.genes = genes
+        self.species = species
+        self.g2s = g2s
+        self.indptr = indptr
+        self.indices = indices
+
+    def species_of(self, gene):
+        """Species label of a gene label"""
+        return self.species.label(self.g2s[self.genes[gene]])
+
+    def genes_of(self, species):
+        """Gene labels of a species label"""
+        j = self.species[species]
+        ids = self.indices[self.indptr[j] : self.indptr[j + 1]]
+        return [self.genes.label(i) for i in ids]
+
+    def as_dict(self):
+        """Python dictionary mapping gene labels to species labels"""
+        species = self.species.labels
+        return dict(zip(self.genes.labels, [species[j] for j in self.g2s.tolist()]))
+
+    def _arrays(self):
+        import numpy
+
+        return {
+            "genes": numpy.array(self.genes.labels, dtype=str),
+            "species": numpy.array(self.species.labels, dtype=str),
+            "g2s": self.g2s,
+            "indptr": self.indptr,
+            "indices": self.indices,
+        }
+
+    @classmethod
+    def _from_arrays(cls, x):
+        return cls(
+            SymbolTable._unique(x["genes"].tolist()),
+            SymbolTable._unique(x["species"].tolist()),
+            x["g2s"],
+            x["indptr"],
+            x["indices"],
+        )
+
+
+def _parse_g2s_map(ifil):
+    """Parse a gene to species map file into a GeneSpeciesMap"""
+    import numpy
+
+    genes = SymbolTable()
+    species = SymbolTable()
+    g2s = {}
+    with iotools.open_input(ifil) as f:
+        for line in f:
+            if line.strip() == "":
+                continue
+            [s, gs] = line.split(":")
+            gs = gs.split(",")
+            gs[-1] = gs[-1].replace("\n", "")
+            j = species.intern(s)
+            for gene in gs:
+                g2s[genes.intern(gene)] = j
+
+    g2s = numpy.array([g2s[i] for i in range(len(genes))], dtype=numpy.int64)
+
+    # Gene ids grouped by species (a stable sort keeps the file order)
+    indices = numpy.argsort(g2s, kind="stable")
+    indptr = numpy.zeros(len(species) + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(g2s, minlength=len(species)), out=indptr[1:])
+    return GeneSpeciesMap(genes, species, g2s, indptr, indices)
+
+
+def load_g2s_map(ifil):
+    """Load a gene to species map file (ASTRAL-multi), i.e., lines of
+    [species]:[gene],[gene],...
+
+    The parsed map is cached next to the file (ifil + '.g2s'), and rebuilt
+    when the size or modification time of the file changes (see
+    iotools.cached_sidecar).
+
+    Parameters
+    ----------
+    ifil : str
+        file name
+
+    Returns
+    -------
+    g2s : GeneSpeciesMap
+
+    """
+    return iotools.cached_sidecar(
+        ifil,
+        ".g2s",
+        _parse_g2s_map,
+        GeneSpeciesMap._arrays,
+        GeneSpeciesMap._from_arrays,
+    )
+
+
+def read_g2s_map(ifil):
+    """
+    Parameters
+    ----------
+    ifil : string
+           name of input gene to species label map file (ASTRAL-multi)
+
+    Returns
+    -------
+    g2sm : python dictionary
+           maps gene labels to species labels
+    """
+    return load_g2s_map(ifil).as_dict()
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PARAMS = (
+    "GENE,SQLN,ALPH,fA,fC,fG,fT,rAC,rAG,rAT,rCG,rCT,rGT\n"
+    "1,100,1.000000,0.25,0.25,0.25,0.25,0.1,0.3,0.1,0.1,0.3,0.1\n"
+    "2,100,0.500000,0.30,0.20,0.20,0.30,0.1,0.3,0.1,0.1,0.3,0.1\n"
+)
+
+TREES = "((A:0.1,B:0.2):0.05,(C:0.1,D:0.3):0.1);\n" * 2
+
+
+def run(tmp_path, *extra):
+    (tmp_path / "params.csv").write_text(PARAMS)
+    (tmp_path / "trees.txt").write_text(TREES)
+    (tmp_path / "out").mkdir()
+    cmd = [
+        sys.executable,
+        os.path.join(REPO, "run_indelible.py"),
+        "--engine",
+        "gtr",
+        "--seed",
+        "1",
+        "-s",
+        "1",
+        "-e",
+        "2",
+        "-p",
+        str(tmp_path / "params.csv"),
+        "-t",
+        str(tmp_path / "trees.txt"),
+        "-o",
+        str(tmp_path / "out"),
+    ] + list(extra)
+    return subprocess.run(cmd, cwd=REPO, capture_output=True, text=True, timeout=60)
+
+
+def test_supermatrix(tmp_path):
+    proc = run(tmp_path, "--supermatrix", str(tmp_path / "super.phy"))
+    assert proc.returncode == 0, proc.stderr
+    assert (tmp_path / "super.phy").read_text().startswith("4 200\n")
+
+
+def test_unwritable_supermatrix_fails(tmp_path):
+    try:
+        proc = run(tmp_path, "--supermatrix", str(tmp_path / "missing" / "super.phy"))
+    except subprocess.TimeoutExpired:
+        pytest.fail("run_indelible.py hung after failing to write the supermatrix")
+    assert proc.returncode != 0
+    assert "Unable to ingest outputs" in proc.stderr